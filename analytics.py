@@ -0,0 +1,307 @@
+# File: analytics.py
+"""Per-round analytics in a small append-only columnar store.
+
+Every finished round adds one row to the `rounds` table (its parameters,
+outcome and totals), and its kills, ejects, tasks and meetings add rows
+to the `events` table. Each column is a flat binary file of fixed-size
+values, so aggregates read only the columns they need, a chunk at a time.
+
+Several workers sharing a game backend also share the store: appends take
+an exclusive lock on a file next to the tables, and readers re-count the
+rows, so each worker sees the rounds the others wrote.
+"""
+import array
+import math
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, so one worker only
+    fcntl = None
+
+from clock import NS
+from eventlog import flusher
+
+
+CHUNK_ROWS = 65536  # rows read per column per step when scanning
+
+WINNERS = ("draw", "crewmates", "impostors", "jester")
+EVENT_TYPES = ("start", "kill", "eject", "task", "meeting_start", "meeting_end", "end")
+
+# (column, array typecode)
+ROUND_COLUMNS = (
+    ("started", "d"),           # unix time
+    ("duration", "f"),          # seconds from start to the winning event
+    ("winner", "B"),            # index into WINNERS
+    ("players", "H"),
+    ("kills", "H"),
+    ("ejects", "H"),
+    ("tasks", "H"),
+    ("meetings", "H"),
+    ("first_kill", "f"),        # seconds from start; NaN when nobody was killed
+    ("kill_cooldown", "f"),
+    ("meeting_duration", "H"),
+    ("task_goal", "H"),
+    ("game_duration", "H"),
+)
+EVENT_COLUMNS = (
+    ("round", "I"),             # row in the rounds table
+    ("type", "B"),              # index into EVENT_TYPES
+    ("t", "f"),                 # seconds since the round started
+)
+GROUP_COLUMNS = ("kill_cooldown", "meeting_duration", "task_goal", "game_duration", "players")
+
+
+class Table:
+    """Append-only table stored as one binary file per column."""
+
+    def __init__(self, directory, columns):
+        self.directory = directory
+        self.columns = dict(columns)
+        os.makedirs(directory, exist_ok=True)
+        for name in self.columns:
+            open(self._path(name), "ab").close()  # an empty table still has its files, for scan()
+        self.refresh()
+        for name in self.columns:
+            if self._file_rows(name) != self.rows:
+                # Columns are appended one after the other; a crash can leave some a row ahead
+                os.truncate(self._path(name), self.rows * self._itemsize(name))
+
+    def refresh(self):
+        """Re-counts the complete rows on disk, including other processes' appends."""
+        self.rows = min(self._file_rows(name) for name in self.columns)
+        return self.rows
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + ".bin")
+
+    def _itemsize(self, name):
+        return array.array(self.columns[name]).itemsize
+
+    def _file_rows(self, name):
+        path = self._path(name)
+        return os.path.getsize(path) // self._itemsize(name) if os.path.exists(path) else 0
+
+    def convert(self, rows):
+        """Rows (dicts with every column) as one array per column, for append(). Raises on a
+        value that doesn't fit its column, before anything is written."""
+        return {name: array.array(typecode, [row[name] for row in rows])
+                for name, typecode in self.columns.items()}
+
+    def append(self, columns):
+        """Writes converted rows to the end of the table."""
+        for name, values in columns.items():
+            with open(self._path(name), "ab") as f:
+                values.tofile(f)
+        self.rows += len(values)
+
+    def scan(self, names, start=0, stop=None):
+        """Yields {column: array} chunks of up to CHUNK_ROWS rows, reading only `names`."""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        files = {name: open(self._path(name), "rb") for name in names}
+        try:
+            for name, f in files.items():
+                f.seek(start * self._itemsize(name))
+            while start < stop:
+                count = min(CHUNK_ROWS, stop - start)
+                chunk = {}
+                for name, f in files.items():
+                    chunk[name] = array.array(self.columns[name])
+                    chunk[name].fromfile(f, count)
+                yield chunk
+                start += count
+        finally:
+            for f in files.values():
+                f.close()
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock shared with the other processes using the same store."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(path, ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class AnalyticsStore:
+    """The rounds and events tables. Finished rounds are buffered and written by flush()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        with _file_lock(path):
+            self.rounds = Table(os.path.join(path, "rounds"), ROUND_COLUMNS)
+            self.events = Table(os.path.join(path, "events"), EVENT_COLUMNS)
+        self.pending = []  # (round row, event rows)
+
+    def add_round(self, summary, events):
+        """Queues a finished round; cheap enough to call with a game lock held."""
+        with self.lock:
+            self.pending.append((summary, events))
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+            if not pending:
+                return
+            with _file_lock(self.path):
+                # Round ids are row numbers, so they are only known once we hold the lock
+                first = self.rounds.refresh()
+                self.events.refresh()
+                # Both tables are converted before either is written: events written without
+                # their round would be claimed by the next round to get that id
+                try:
+                    events = self.events.convert([{"round": first + i, **event}
+                                                  for i, (_, events) in enumerate(pending) for event in events])
+                    rounds = self.rounds.convert([summary for summary, _ in pending])
+                except Exception:
+                    self.pending[:0] = pending  # nothing was written; kept for the next flush
+                    raise
+                # Events first: a round row is only visible once all its events are on disk
+                self.events.append(events)
+                self.rounds.append(rounds)
+
+    def aggregate(self, group_by=None):
+        """Win rate by faction, time to first kill and task throughput, optionally per parameter value."""
+        groups = defaultdict(lambda: {"rounds": 0, "wins": [0] * len(WINNERS), "first_kill_sum": 0.0,
+                                      "first_kill_rounds": 0, "tasks": 0, "seconds": 0.0})
+        names = ["winner", "first_kill", "tasks", "duration"] + ([group_by] if group_by else [])
+        with self.lock:
+            rows = self.rounds.refresh()
+        for chunk in self.rounds.scan(names, stop=rows):
+            keys = chunk[group_by] if group_by else [None] * len(chunk["winner"])
+            for key, winner, first_kill, tasks, duration in zip(
+                    keys, chunk["winner"], chunk["first_kill"], chunk["tasks"], chunk["duration"]):
+                g = groups[round(key, 3) if isinstance(key, float) else key]
+                g["rounds"] += 1
+                g["wins"][winner] += 1
+                if not math.isnan(first_kill):
+                    g["first_kill_sum"] += first_kill
+                    g["first_kill_rounds"] += 1
+                g["tasks"] += tasks
+                g["seconds"] += duration
+
+        def report(g):
+            return {
+                "rounds": g["rounds"],
+                "win_rate": {w: round(n / g["rounds"], 4) for w, n in zip(WINNERS, g["wins"])},
+                "time_to_first_kill": {
+                    "mean_seconds": round(g["first_kill_sum"] / g["first_kill_rounds"], 2)
+                    if g["first_kill_rounds"] else None,
+                    "rounds_with_kill": g["first_kill_rounds"],
+                },
+                "tasks_per_minute": round(g["tasks"] / (g["seconds"] / 60), 3) if g["seconds"] else None,
+                "mean_duration_seconds": round(g["seconds"] / g["rounds"], 2),
+            }
+
+        if group_by is None:
+            return report(groups[None]) if groups else {"rounds": 0}
+        return {"group_by": group_by, "groups": {str(key): report(g) for key, g in sorted(groups.items())}}
+
+    def timeline(self, round_id):
+        """One round's summary and timeline, or None if it doesn't exist (yet)."""
+        with self.lock:
+            rows = self.rounds.refresh()
+            event_rows = self.events.refresh()
+        if not 0 <= round_id < rows:
+            return None
+        chunk = next(self.rounds.scan(self.rounds.columns, round_id, round_id + 1))
+        summary = {name: round(column[0], 3) if isinstance(column[0], float) else column[0]
+                   for name, column in chunk.items()}
+        summary["winner"] = WINNERS[summary["winner"]]
+        if math.isnan(summary["first_kill"]):
+            summary["first_kill"] = None
+        timeline = []
+        for chunk in self.events.scan(("round", "type", "t"), stop=event_rows):
+            for r, event_type, t in zip(chunk["round"], chunk["type"], chunk["t"]):
+                if r == round_id:
+                    timeline.append({"type": EVENT_TYPES[event_type], "t": round(t, 3)})
+            if chunk["round"] and chunk["round"][-1] > round_id:
+                break  # rounds are written in order
+        return {"round": round_id, **summary, "timeline": timeline}
+
+
+class RoundRecorder:
+    """Follows one game's events and hands each finished round to the store.
+
+    GameState calls record() for every new event (not for replayed ones),
+    with its lock held. A round that is reset before it ends is dropped.
+    Events another worker wrote to a shared log come with live=False: they
+    are followed, but the worker that ends the round is the one to store it.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.current = None
+
+    def record(self, game, event, now, live=True):
+        event_type = event["type"]
+        if event_type == "start":
+            self.current = {
+                "started": now,
+                "params": {
+                    "players": len(game.players),
+                    "kill_cooldown": game.kill_cooldown / NS,
+                    "meeting_duration": game.meeting_duration,
+                    "task_goal": game.task_goal,
+                    "game_duration": game.game_duration,
+                },
+                "events": [],
+            }
+        elif event_type == "reset":
+            self.current = None
+        if self.current is None:
+            return
+        if event_type == "process_eject":
+            event_type = "eject"
+        t = (now - self.current["started"]) / NS
+        if event_type in EVENT_TYPES:
+            self.current["events"].append({"type": EVENT_TYPES.index(event_type), "t": t})
+        if event_type == "meeting_end" and event.get("ejected") and \
+                game.players[event["ejected"]].death_type == "ejected":
+            self.current["events"].append({"type": EVENT_TYPES.index("eject"), "t": t})
+        if game.game_state == "ended":
+            if live:
+                self._finish(game, now)
+            else:
+                self.current = None
+
+    def _finish(self, game, now):
+        current, self.current = self.current, None
+        duration = (now - current["started"]) / NS
+        events = current["events"] + [{"type": EVENT_TYPES.index("end"), "t": duration}]
+        counts = defaultdict(int)
+        first_kill = math.nan
+        for event in events:
+            name = EVENT_TYPES[event["type"]]
+            counts[name] += 1
+            if name == "kill" and math.isnan(first_kill):
+                first_kill = event["t"]
+        self.store.add_round({
+            "started": current["started"] / NS,
+            "duration": duration,
+            "winner": WINNERS.index(game.game_winner) if game.game_winner in WINNERS else 0,
+            "kills": counts["kill"],
+            "ejects": counts["eject"],
+            "tasks": counts["task"],
+            "meetings": counts["meeting_start"],
+            "first_kill": first_kill,
+            **current["params"],
+        }, events)
+
+
+def open_analytics(path):
+    """Opens the store and registers it with the event log's background flusher."""
+    store = AnalyticsStore(path)
+    flusher.add(store)
+    return store
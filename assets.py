@@ -0,0 +1,156 @@
+# File: assets.py
+import gzip
+import hashlib
+import os
+import re
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional; without it assets are served gzip or plain
+    brotli = None
+
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "/static/"
+IMMUTABLE = "public, max-age=31536000, immutable"  # hashed file names never change content
+REVALIDATE = "no-cache"                            # pages keep stable URLs, so revalidate by ETag
+MIN_COMPRESS_SIZE = 512
+
+MEDIA_TYPES = {".html": "text/html; charset=utf-8", ".js": "text/javascript; charset=utf-8",
+               ".css": "text/css; charset=utf-8", ".mp3": "audio/mpeg"}
+PLACEHOLDER = re.compile(r"\{\{([\w.-]+)\}\}")  # {{admin.js}} in a page -> hashed URL
+
+
+def accepted_encodings(header):
+    """Accept-Encoding as {coding: q}; q=0 means the client refuses that coding."""
+    accepted = {}
+    for item in header.split(","):
+        coding, *params = item.split(";")
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def negotiate(request, encodings):
+    """Picks the encoding the client ranks highest out of the ones available (br on a tie)."""
+    accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+    best, best_q = "identity", 0.0
+    for encoding in ("br", "gzip"):
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if encoding in encodings and q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data):
+    """Returns {encoding: body} with every encoding that actually makes `data` smaller."""
+    bodies = {"identity": data}
+    if len(data) >= MIN_COMPRESS_SIZE:
+        bodies["gzip"] = gzip.compress(data, 9, mtime=0)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in bodies.items()
+            if encoding == "identity" or len(body) < len(data)}
+
+
+class Asset:
+    """One file, loaded once and compressed on its first request (not at startup)."""
+
+    __slots__ = ("name", "url", "media_type", "etag", "data", "_bodies")
+
+    def __init__(self, name, data, url=None):
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        self.name = name
+        self.url = url or f"{STATIC_URL}{stem}.{digest}{ext}"
+        self.media_type = MEDIA_TYPES.get(ext, "application/octet-stream")
+        self.etag = f'"{digest}"'
+        self.data = data
+        self._bodies = None
+
+    @property
+    def bodies(self):
+        if self._bodies is None:
+            self._bodies = compress(self.data)  # two racing first requests just compress twice
+        return self._bodies
+
+    def response(self, request, cache_control):
+        headers = {"ETag": self.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if request.headers.get("if-none-match") == self.etag:
+            return Response(status_code=304, headers=headers)
+        encoding = negotiate(request, self.bodies)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(self.bodies[encoding], media_type=self.media_type, headers=headers)
+
+
+class AssetStore:
+    """The static/ directory: pages at stable URLs, everything else under content-hashed names.
+
+    Pages reference other assets as {{name.ext}}, rewritten to their hashed
+    URL so browsers can cache those forever. Startup only hashes the other
+    files (their URLs are needed first); pages are built on first request.
+    """
+
+    def __init__(self, directory=STATIC_DIR):
+        self.directory = directory
+        self.files = {}  # hashed file name -> Asset
+        self.pages = {}  # page file name -> Asset
+        self.load()
+
+    def load(self):
+        names = sorted(os.listdir(self.directory))
+        urls = {}
+        for name in names:
+            if not name.endswith(".html"):
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    asset = Asset(name, f.read())
+                self.files[asset.url[len(STATIC_URL):]] = asset
+                urls[name] = asset.url
+        self.urls = urls
+
+    def page(self, request, name):
+        asset = self.pages.get(name)
+        if asset is None:
+            with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                html = PLACEHOLDER.sub(lambda m: self.urls[m.group(1)], f.read())
+            asset = self.pages[name] = Asset(name, html.encode())
+        return asset.response(request, REVALIDATE)
+
+    def static(self, request, name):
+        asset = self.files.get(name)
+        if asset is None:
+            return Response(status_code=404)
+        return asset.response(request, IMMUTABLE)
+
+
+# ------------------------------
+# Compressed JSON
+# ------------------------------
+gzip_cache = {}  # (lobby id, etag) -> gzipped body, for cached JSON bodies served many times
+
+
+def json_response(request, etag, body, lobby_id=""):
+    """Serves a cached JSON body with ETag/304 and gzip when the client accepts it."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if len(body) >= MIN_COMPRESS_SIZE and negotiate(request, ("gzip",)) == "gzip":
+        compressed = gzip_cache.get((lobby_id, etag))
+        if compressed is None:
+            if len(gzip_cache) >= 256:
+                gzip_cache.clear()
+            compressed = gzip_cache[lobby_id, etag] = gzip.compress(body.encode(), 6)
+        headers["Content-Encoding"] = "gzip"
+        return Response(compressed, media_type="application/json", headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
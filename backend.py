@@ -0,0 +1,332 @@
+# File: backend.py
+"""Where the lobbies' game state lives: in this process, or shared by several workers.
+
+A game is rebuilt from its events, so sharing a game means sharing its
+event log.
+
+memory (the default)
+    Each lobby's log is a file under the data directory and this process
+    is the only one serving it.
+
+sqlite
+    Every lobby's log is in one SQLite database in WAL mode, opened by
+    every uvicorn worker (`GAME_BACKEND=sqlite uvicorn main:app --workers 4`):
+
+    - A transition runs inside BEGIN IMMEDIATE, SQLite's write lock, so one
+      worker at a time writes to the games. It first applies the events
+      other workers wrote since it last looked, then validates and appends.
+    - Reads (/status, role reveals) look up the lobby's last sequence number
+      and apply any newer events before serving. WAL readers never wait for
+      the writer, so status traffic spreads over every worker.
+    - Every worker re-arms the game timers from the state it caught up to.
+      The scheduled transitions check that they are due, so the first worker
+      to fire one applies it and the others find nothing left to do.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from eventlog import SNAPSHOT_EVERY, open_log
+from idempotency import IDEMPOTENCY_TTL, IdempotencyCache, KeyReused
+
+
+BACKEND = os.environ.get("GAME_BACKEND", "memory")  # memory / sqlite
+SYNC_INTERVAL = 0.05  # seconds between checks for other workers' changes, for /status/stream pushes
+BUSY_TIMEOUT = 10     # seconds a worker waits for the write lock before the request fails
+
+class BackendBusy(Exception):
+    """Another worker held the database's write lock for longer than BUSY_TIMEOUT."""
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lobbies (
+    id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL DEFAULT 0,       -- last event
+    active REAL NOT NULL DEFAULT 0        -- unix time any worker last saw the lobby in use
+);
+CREATE TABLE IF NOT EXISTS events (
+    lobby TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (lobby, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    lobby TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS replies (
+    lobby TEXT NOT NULL,
+    key TEXT NOT NULL,
+    request TEXT NOT NULL,
+    result TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (lobby, key)
+) WITHOUT ROWID;
+"""
+
+
+# ------------------------------
+# In-process
+# ------------------------------
+class MemoryBackend:
+    """Games live in this process only; their logs are files under data_dir, if there is one."""
+
+    shared = False
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir
+
+    def open_log(self, lobby_id, snapshot_source):
+        if not self.data_dir:
+            return None
+        return open_log(os.path.join(self.data_dir, lobby_id + ".log"), snapshot_source)
+
+    def replies(self, game):
+        return IdempotencyCache()
+
+    def lobby_ids(self):
+        """Lobbies with a log on disk."""
+        if not self.data_dir or not os.path.isdir(self.data_dir):
+            return set()
+        return {name.split(".")[0] for name in os.listdir(self.data_dir) if name.endswith((".log", ".log.snap"))}
+
+    def claim(self, lobby_id):
+        return True  # the registry's own dict is the only one
+
+    def touch(self, activity):
+        pass
+
+    def idle_since(self, lobby_id, cutoff):
+        return True
+
+    def check(self):
+        return True
+
+
+# ------------------------------
+# SQLite, shared by every worker
+# ------------------------------
+class SQLiteBackend:
+    """Every lobby's events, snapshots and idempotent replies in one WAL-mode database."""
+
+    shared = True
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()  # one connection per thread
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            # Commits survive a crashed worker; a power cut may lose the last few, like the event log's group commit
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def open_log(self, lobby_id, snapshot_source):
+        return SharedLog(self, lobby_id, snapshot_source)
+
+    def replies(self, game):
+        return SharedReplies(game)
+
+    def lobby_ids(self):
+        return set(self.heads())
+
+    def heads(self):
+        """Lobby id -> sequence number of its last event."""
+        return dict(self.connection().execute("SELECT id, seq FROM lobbies"))
+
+    def claim(self, lobby_id):
+        """Registers a lobby id; False if a worker already did."""
+        conn = self.connection()
+        with _immediate(conn):
+            cur = conn.execute("INSERT OR IGNORE INTO lobbies (id, active) VALUES (?, ?)", (lobby_id, time.time()))
+        return cur.rowcount == 1
+
+    def drop(self, lobby_id):
+        conn = self.connection()
+        with _immediate(conn):
+            for table, column in (("lobbies", "id"), ("events", "lobby"), ("snapshots", "lobby"), ("replies", "lobby")):
+                conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (lobby_id,))
+
+    def touch(self, activity):
+        """Publishes this worker's {lobby id: unix time last used}, for idle eviction."""
+        conn = self.connection()
+        with _immediate(conn):
+            conn.executemany("UPDATE lobbies SET active = MAX(active, ?) WHERE id = ?",
+                             [(active, lobby_id) for lobby_id, active in activity.items()])
+
+    def idle_since(self, lobby_id, cutoff):
+        """True if no worker has used the lobby since `cutoff` (unix time)."""
+        row = self.connection().execute("SELECT active FROM lobbies WHERE id = ?", (lobby_id,)).fetchone()
+        return row is None or row[0] < cutoff
+
+    def check(self):
+        """True if the database answers, for the readiness probe."""
+        try:
+            self.connection().execute("SELECT 1")
+        except sqlite3.Error:
+            return False
+        return True
+
+
+@contextmanager
+def _immediate(conn):
+    """A write transaction: waits for SQLite's write lock, commits on success."""
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError as e:
+        if "locked" in str(e) or "busy" in str(e):
+            raise BackendBusy(f"database still locked after {BUSY_TIMEOUT}s") from e
+        raise
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class SharedLog:
+    """One lobby's events in the shared database; takes the place of its EventLog.
+
+    append() is only valid inside transaction(), which GameState opens around
+    every transition.
+    """
+
+    shared = True
+
+    def __init__(self, backend, lobby_id, snapshot_source):
+        self.backend = backend
+        self.lobby_id = lobby_id
+        self.snapshot_source = snapshot_source  # callable -> (seq, state dict)
+        self.conn = None  # the writing connection while a transaction is open
+        self.writer = None  # and the thread it belongs to
+        self.depth = 0
+        self.last_seq = 0
+        self.snapshot_seq = 0
+
+    def head(self):
+        row = self.backend.connection().execute("SELECT seq FROM lobbies WHERE id = ?", (self.lobby_id,)).fetchone()
+        return row[0] if row else 0
+
+    def load(self):
+        """Returns (snapshot or None, events logged after it), like EventLog.load()."""
+        return self.changes(0)
+
+    def changes(self, version):
+        """Returns (snapshot newer than `version` or None, the events after it and `version`)."""
+        writing = self.conn is not None and self.writer == threading.get_ident()
+        conn = self.conn if writing else self.backend.connection()
+        if not writing:
+            conn.execute("BEGIN")  # one consistent read, even if a writer snapshots in between
+        try:
+            row = conn.execute("SELECT seq, state FROM snapshots WHERE lobby = ? AND seq > ?",
+                               (self.lobby_id, version)).fetchone()
+            snapshot = None
+            if row:
+                snapshot = {"seq": row[0], "state": json.loads(row[1])}
+                version = self.snapshot_seq = row[0]
+            events = [json.loads(event) for (event,) in conn.execute(
+                "SELECT event FROM events WHERE lobby = ? AND seq > ? ORDER BY seq", (self.lobby_id, version))]
+        finally:
+            if not writing:
+                conn.execute("COMMIT")
+        return snapshot, events
+
+    @contextmanager
+    def transaction(self):
+        """Holds the database's write lock; commits the events appended meanwhile. Call with the
+        game's write_lock held: reads in other threads go on while this one waits."""
+        if self.depth:  # nested, e.g. an idempotent request around its transition
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+            return
+        conn = self.backend.connection()
+        self.depth, self.last_seq = 1, 0
+        try:
+            with _immediate(conn):
+                self.conn, self.writer = conn, threading.get_ident()
+                yield
+                if self.last_seq:
+                    conn.execute("UPDATE lobbies SET seq = ? WHERE id = ?", (self.last_seq, self.lobby_id))
+                    if self.last_seq - self.snapshot_seq >= SNAPSHOT_EVERY and self.snapshot_source:
+                        self._snapshot(conn)
+        finally:
+            self.depth, self.conn, self.writer = 0, None, None
+
+    def append(self, seq, event):
+        self.conn.execute("INSERT INTO events (lobby, seq, event) VALUES (?, ?, ?)",
+                          (self.lobby_id, seq, json.dumps({"seq": seq, **event}, separators=(",", ":"))))
+        self.last_seq = seq
+
+    def _snapshot(self, conn):
+        """Stores the owner's state and drops the events it covers; workers further behind load it instead."""
+        seq, state = self.snapshot_source()
+        conn.execute("INSERT OR REPLACE INTO snapshots (lobby, seq, state) VALUES (?, ?, ?)",
+                     (self.lobby_id, seq, json.dumps(state)))
+        conn.execute("DELETE FROM events WHERE lobby = ? AND seq <= ?", (self.lobby_id, seq))
+        self.snapshot_seq = seq
+
+    def close(self):
+        pass  # every event is committed by its transition
+
+    def delete(self):
+        self.backend.drop(self.lobby_id)
+
+
+class SharedReplies:
+    """Idempotent replies stored next to the game's events, so a retry sent to
+    any worker gets the first reply. Same interface as IdempotencyCache.
+
+    The lookup, the transition and the stored reply share one write
+    transaction; a concurrent duplicate waits for the lock, then finds the reply.
+    """
+
+    def __init__(self, game, ttl=IDEMPOTENCY_TTL):
+        self.game = game
+        self.ttl = ttl
+        self.next_purge = 0
+
+    def run(self, key, request, transition, *args):
+        """Returns (result, replayed). `request` identifies what the key was first used for."""
+        game, log = self.game, self.game.log
+        request = repr(request)
+        with game.writing():
+            now = time.time()
+            conn = log.conn
+            row = conn.execute("SELECT request, result FROM replies WHERE lobby = ? AND key = ? AND expires > ?",
+                               (log.lobby_id, key, now)).fetchone()
+            if row is not None:
+                if row[0] != request:
+                    raise KeyReused(key)
+                return json.loads(row[1]), True
+            result = transition(*args)
+            conn.execute("INSERT OR REPLACE INTO replies (lobby, key, request, result, expires) VALUES (?, ?, ?, ?, ?)",
+                         (log.lobby_id, key, request, json.dumps(result), now + self.ttl))
+            if now > self.next_purge:
+                conn.execute("DELETE FROM replies WHERE lobby = ? AND expires <= ?", (log.lobby_id, now))
+                self.next_purge = now + self.ttl / 10
+        return result, False
+
+
+def open_backend(name=BACKEND, data_dir=None):
+    """The backend called `name`; sqlite keeps its database in data_dir/state.db."""
+    if name == "memory":
+        return MemoryBackend(data_dir)
+    if name == "sqlite":
+        if not data_dir:
+            raise ValueError("the sqlite backend needs a data directory")
+        return SQLiteBackend(os.path.join(data_dir, "state.db"))
+    raise ValueError(f"unknown game backend {name!r} (expected memory or sqlite)")
@@ -0,0 +1,856 @@
+# File: bench.py
+"""Load and latency benchmarks for the game server.
+
+Runs in-process against main.app by default, or against a running server
+with --url. Every scenario reports p50/p99 latency, throughput and CPU;
+--save writes the numbers to a baseline file and --compare checks a run
+against one, exiting non-zero on a regression.
+
+    python bench.py room --displays 20 --readers 10 --stations 4 --duration 10
+    python bench.py room --url http://127.0.0.1:8000 --server-pid 1234
+    python bench.py lobbies --counts 1 10 100 500
+    python bench.py contention --games 50 --threads 32
+    python bench.py taps --url http://127.0.0.1:8000
+    python bench.py roster --sizes 10 100 500 1000
+    python bench.py workers --workers 1 4
+    python bench.py profiles --duration 10
+    python bench.py coldstart --runs 10 --save baselines/coldstart.json
+    python bench.py dom --players 10 100   # needs playwright and its chromium
+    python bench.py room --save baselines/room.json
+    python bench.py room --compare baselines/room.json
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+
+os.environ.setdefault("GAME_DATA_DIR", tempfile.mkdtemp(prefix="amongus-bench-"))
+
+ROOM_LOBBY = "bench-room"  # the room scenario plays here, so a live server's main lobby is left alone
+TOLERANCE = 0.20           # relative slowdown allowed by --compare before it counts as a regression
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def summarize(samples, elapsed):
+    """Latency samples (ms) -> the numbers reported and saved for one row."""
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(statistics.mean(samples), 3),
+    }
+
+
+def print_rows(label, rows):
+    print(f"{label:>22} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for name, row in rows.items():
+        print(f"{name:>22} {row['requests']:>9} {row['rps']:>9.1f} {row['p50_ms']:>8.3f} "
+              f"{row['p99_ms']:>8.3f} {row['mean_ms']:>8.3f}")
+
+
+# ------------------------------
+# Clients and CPU accounting
+# ------------------------------
+def open_client(url):
+    """An HTTP client for the server under test: in-process main.app, or `url`."""
+    if url:
+        import httpx
+        return httpx.Client(base_url=url, limits=httpx.Limits(max_connections=256))
+    from fastapi.testclient import TestClient
+    import main
+    return TestClient(main.app)
+
+
+def cpu_seconds(server_pid=None):
+    """CPU time used so far by the server: this process in-process, or `server_pid` (Linux)."""
+    if server_pid is None:
+        return time.process_time()
+    with open(f"/proc/{server_pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")  # utime + stime
+
+
+def wait_for_port(server, port):
+    """Blocks until a spawned server accepts connections. Plain connects are cheap,
+    so polling doesn't steal CPU from the startup being measured."""
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return
+        except OSError:
+            if server.poll() is not None:
+                sys.exit(f"server exited with {server.returncode}")
+            time.sleep(0.005)
+
+
+def rss_mb(pid):
+    """Resident memory of a process and all its children, in MB (Linux)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except OSError:
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    total, pending = 0, [pid]
+    while pending:
+        p = pending.pop()
+        pending.extend(children.get(p, ()))
+        try:
+            with open(f"/proc/{p}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            pass
+    return round(total / 1024, 1)
+
+
+class CpuMeter:
+    """Server CPU use over a run, as a percentage of one core."""
+
+    def __init__(self, url, server_pid):
+        # Remote runs can only be measured when the server's pid is known
+        self.pid = server_pid
+        self.enabled = not url or server_pid is not None
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = cpu_seconds(self.pid) if self.enabled else 0
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        self.percent = round(100 * (cpu_seconds(self.pid) - self.cpu) / wall, 1) if self.enabled else None
+
+
+def setup_lobby(client, lobby_id, players=10):
+    client.post("/lobby", data={"lobby_id": lobby_id})
+    for i in range(players):
+        client.get(f"/lobby/{lobby_id}/connect/{lobby_id}-P{i}/C{i}")
+    client.post(f"/lobby/{lobby_id}/reset")
+    client.post(f"/lobby/{lobby_id}/start")
+
+
+def poll_status(url, threads, requests):
+    """One client process: `threads` keep-alive connections sharing `requests` GET /status.
+    Returns (wall clock start, end, latencies in ms)."""
+    import httpx
+
+    def poll(n):
+        local = []
+        with httpx.Client(base_url=url) as client:
+            for _ in range(n):
+                start = time.perf_counter()
+                client.get("/status")
+                local.append((time.perf_counter() - start) * 1000)
+        return local
+
+    started = time.time()
+    with ThreadPoolExecutor(threads) as pool:
+        samples = [ms for local in pool.map(poll, [requests // threads] * threads) for ms in local]
+    return started, time.time(), samples
+
+
+# ------------------------------
+# Scenarios
+# ------------------------------
+def bench_room(displays=20, readers=10, stations=4, duration=10.0, poll_interval=0.5,
+               players=10, url=None, server_pid=None):
+    """One room under load: display pages polling /status, ESP32 readers, task stations."""
+    samples = defaultdict(list)
+    samples_lock = threading.Lock()
+    base = f"/lobby/{ROOM_LOBBY}"
+    rfids = [f"R{i}" for i in range(players)]
+
+    def timed(endpoint, call):
+        start = time.perf_counter()
+        response = call()
+        ms = (time.perf_counter() - start) * 1000
+        with samples_lock:
+            samples[endpoint].append(ms)
+        return response
+
+    def display(deadline):
+        # Like the pages: conditional GETs, so an unchanged status is a 304
+        etag = None
+        while time.perf_counter() < deadline:
+            headers = {"If-None-Match": etag} if etag else {}
+            response = timed("GET /status", lambda: client.get(base + "/status", headers=headers))
+            etag = response.headers.get("etag", etag)
+            if response.status_code == 200 and response.json()["game_state"] == "ended":
+                restart()
+            time.sleep(poll_interval * random.uniform(0.8, 1.2))
+
+    def reader(deadline):
+        while time.perf_counter() < deadline:
+            if random.random() < 0.2:
+                i = random.randrange(players)
+                timed("GET /connect", lambda: client.get(f"{base}/connect/{rfids[i]}/C{i}"))
+            else:
+                impostor, target = random.sample(rfids, 2)
+                timed("POST /kill", lambda: client.post(f"{base}/kill/{impostor}/{target}"))
+            time.sleep(random.uniform(0, 0.05))
+
+    def station(deadline):
+        while time.perf_counter() < deadline:
+            timed("POST /complete_task", lambda: client.post(base + "/logistics/complete_task"))
+            time.sleep(random.uniform(0, 0.2))
+
+    restart_lock = threading.Lock()
+
+    def restart():
+        # The admin starting the next game, done by whichever display notices first
+        if restart_lock.acquire(blocking=False):
+            try:
+                timed("POST /reset", lambda: client.post(base + "/reset"))
+                timed("POST /start", lambda: client.post(base + "/start"))
+            finally:
+                restart_lock.release()
+
+    with open_client(url) as client:
+        client.post("/lobby", data={"lobby_id": ROOM_LOBBY})
+        for i, rfid in enumerate(rfids):
+            client.get(f"{base}/connect/{rfid}/C{i}")
+        restart()
+        samples.clear()
+
+        actors = [display] * displays + [reader] * readers + [station] * stations
+        with CpuMeter(url, server_pid) as cpu, ThreadPoolExecutor(len(actors)) as pool:
+            deadline = time.perf_counter() + duration
+            for future in [pool.submit(actor, deadline) for actor in actors]:
+                future.result()
+        client.delete(base)
+
+    elapsed = duration
+    rows = {endpoint: summarize(s, elapsed) for endpoint, s in sorted(samples.items())}
+    rows["total"] = summarize([ms for s in samples.values() for ms in s], elapsed)
+    print_rows("endpoint", rows)
+    print(f"server cpu: {cpu.percent}%" if cpu.percent is not None else "server cpu: n/a (pass --server-pid)")
+    return {"rows": rows, "cpu_percent": cpu.percent}
+
+
+def bench_lobbies(counts=(1, 10, 100, 500), requests=2000, url=None, server_pid=None):
+    """/status latency while the number of concurrently running lobbies grows."""
+    rows = {}
+    with open_client(url) as client, CpuMeter(url, server_pid) as cpu:
+        created = 0
+        for count in counts:
+            while created < count:
+                setup_lobby(client, f"bench{created}")
+                created += 1
+            ids = [f"bench{i}" for i in range(count)]
+            samples = []
+            started = time.perf_counter()
+            for _ in range(requests):
+                lobby_id = random.choice(ids)
+                start = time.perf_counter()
+                client.get(f"/lobby/{lobby_id}/status")
+                samples.append((time.perf_counter() - start) * 1000)
+            rows[f"{count} lobbies"] = summarize(samples, time.perf_counter() - started)
+        for i in range(created):
+            client.delete(f"/lobby/bench{i}")
+    print_rows("lobbies", rows)
+    print(f"server cpu: {cpu.percent}%" if cpu.percent is not None else "server cpu: n/a (pass --server-pid)")
+    return {"rows": rows, "cpu_percent": cpu.percent}
+
+
+def bench_taps(taps=500, batch=8, url=None, server_pid=None):
+    """Per-tap cost of the reader paths: a new connection per URL request, vs binary frames kept alive."""
+    import reader
+
+    def fresh_client():
+        # What the old firmware did: a new HTTPClient (and TCP connection) per tap
+        return open_client(url) if url else nullcontext(client)
+
+    rows = {}
+    with open_client(url) as client, CpuMeter(url, server_pid) as cpu:
+        client.post("/lobby", data={"lobby_id": ROOM_LOBBY})
+        base = f"/lobby/{ROOM_LOBBY}"
+        # Taps hit a game that isn't running, so the game state is the same for every path
+        client.post(base + "/reset")
+
+        samples = []
+        started = time.perf_counter()
+        for i in range(taps):
+            start = time.perf_counter()
+            with fresh_client() as c:
+                c.post(f"{base}/kill/0A0B0C{i % 256:02X}/R1")
+            samples.append((time.perf_counter() - start) * 1000)
+        rows["url, new connection"] = summarize(samples, time.perf_counter() - started)
+
+        for size in (1, batch):
+            samples = []
+            started = time.perf_counter()
+            seq = 0
+            for _ in range(taps // size):
+                frame = reader.encode_taps("R1", [(seq + j, reader.ACTION_KILL, bytes((10, 11, 12, j))) for j in range(size)])
+                seq += size
+                start = time.perf_counter()
+                client.post(base + "/reader", content=frame)
+                ms = (time.perf_counter() - start) * 1000
+                samples.extend([ms / size] * size)  # per tap
+            rows[f"binary, batch of {size}"] = summarize(samples, time.perf_counter() - started)
+        client.delete(base)
+    print_rows("path (ms per tap)", rows)
+    print(f"server cpu: {cpu.percent}%" if cpu.percent is not None else "server cpu: n/a (pass --server-pid)")
+    return {"rows": rows, "cpu_percent": cpu.percent}
+
+
+def bench_roster(sizes=(10, 100, 500, 1000), rounds=50):
+    """Cost of the roster-sized paths as the player count grows: role assignment, win checks, /status."""
+    from game import player_color
+    import main
+
+    rows = {}
+    with open_client(None) as client, CpuMeter(None, None) as cpu:
+        for size in sizes:
+            lobby_id = f"roster{size}"
+            client.post("/lobby", data={"lobby_id": lobby_id})
+            game = main.lobbies.get(lobby_id).game
+            game.required_players = size
+            for i in range(size):
+                game.connect(f"R{i}", player_color(i))
+            samples = defaultdict(list)
+            started = time.perf_counter()
+            for _ in range(rounds):
+                start = time.perf_counter()
+                game.reset()
+                samples["reset (assign roles)"].append((time.perf_counter() - start) * 1000)
+                game.start()
+                game.kill_cooldown = 0
+                impostors = [r for r, p in game.players.items() if p.role == "impostor"]
+                victims = [r for r, p in game.players.items() if p.role == "crewmate"]
+                for victim in victims[:5]:
+                    start = time.perf_counter()
+                    game.kill(random.choice(impostors), victim)  # includes the win check
+                    samples["kill + win check"].append((time.perf_counter() - start) * 1000)
+                    start = time.perf_counter()
+                    client.get(f"/lobby/{lobby_id}/status")   # changed: serializes the whole roster
+                    samples["GET /status (fresh)"].append((time.perf_counter() - start) * 1000)
+                    start = time.perf_counter()
+                    client.get(f"/lobby/{lobby_id}/status")   # unchanged: served from the cache
+                    samples["GET /status (cached)"].append((time.perf_counter() - start) * 1000)
+            elapsed = time.perf_counter() - started
+            for name, s in samples.items():
+                rows[f"{size} players, {name}"] = summarize(s, elapsed)
+            client.delete(f"/lobby/{lobby_id}")
+    print_rows("players, operation", rows)
+    print(f"server cpu: {cpu.percent}%")
+    return {"rows": rows, "cpu_percent": cpu.percent}
+
+
+class EventWatch:
+    """A GameState log that records each event with the game's state right after it."""
+
+    shared = False
+
+    def __init__(self):
+        self.game = None
+        self.entries = []  # (event, game_state, winner)
+
+    def append(self, seq, event):
+        self.entries.append((event, self.game.game_state, self.game.game_winner))
+
+
+def contention_errors(entries):
+    """What the race must never produce: a player dying twice, a meeting started or ended
+    twice, moves played after the end, or a round that doesn't end exactly once."""
+    errors = []
+    dead, ends, meeting, state, winner, pending = set(), 0, False, "waiting", None, None
+    for event, new_state, new_winner in entries:
+        kind = event["type"]
+        if kind == "reset":
+            dead, ends, meeting = set(), 0, False
+        if state == "ended" and kind in ("kill", "eject", "task"):
+            errors.append(f"{kind} after the game ended")
+        if kind == "set_eject":
+            pending = event["rfid"]
+        dying = {"kill": event.get("target"), "eject": event.get("rfid"),
+                 "meeting_end": event.get("ejected"), "process_eject": pending}.get(kind)
+        if dying in dead:
+            errors.append(f"{dying} died twice")
+        elif dying:
+            dead.add(dying)
+        if kind in ("meeting_start", "meeting_end"):
+            if meeting == (kind == "meeting_start"):
+                errors.append(f"{kind} while the meeting was {'on' if meeting else 'over'}")
+            meeting = kind == "meeting_start"
+            pending = None
+        if state != "ended" and new_state == "ended":
+            ends += 1
+        elif state == "ended" and new_winner != winner:
+            errors.append(f"winner changed from {winner} to {new_winner}")
+        state, winner = new_state, new_winner
+    if ends != 1:
+        errors.append(f"the game ended {ends} times")
+    return errors
+
+
+def bench_contention(games=50, threads=32, ops=3000, players=40):
+    """Threads racing on one GameState: every impostor killing the same victim, votes
+    cast while the meeting ends, and at last every move that can end the game at once.
+    Checks the invariants after each race, and the event log for double deaths and endings."""
+    from game import SKIP, GameState
+
+    samples = defaultdict(list)
+    samples_lock = threading.Lock()
+    errors = []
+    violations = 0
+    elapsed = 0.0
+
+    def run(op):
+        name, call, args = op
+        start = time.perf_counter()
+        call(*args)
+        ms = (time.perf_counter() - start) * 1000
+        with samples_lock:
+            samples[name].append(ms)
+
+    for _ in range(games):
+        watch = EventWatch()
+        game = watch.game = GameState(log=watch)
+        # Win thresholds out of reach, so the game only ends in the final race
+        game.configure(task_goal=10 * ops, impostor_win_kills=players,
+                       impostor_ratio=0.25, jester_ratio=0, kill_cooldown=0, meeting_delay=0, meeting_duration=0)
+        for i in range(players):
+            game.connect(f"R{i}", f"C{i}")
+        game.reset()
+        game.start()
+        found = []
+
+        def race(batch):
+            nonlocal elapsed
+            random.shuffle(batch)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(run, batch))
+            elapsed += time.perf_counter() - started
+            found.extend(game.check_invariants())
+            return len(batch)
+
+        def alive(impostors=False):
+            return [rfid for rfid, p in game.players.items() if p.alive and (p.role == "impostor") == impostors]
+
+        done = 0
+        while done < ops and game.game_state == "running" and len(alive()) > 2:
+            # Every impostor goes for the same victim; the meeting timer and tasks race them
+            target = random.choice(alive())
+            batch = [("kill", game.kill, (random.choice(alive(True)), target)) for _ in range(threads)]
+            batch += [("complete_task", game.complete_task, ())] * (threads // 2)
+            batch += [("start_meeting", game.start_meeting, ())] * 4
+            batch += [("status", game.status_snapshot, ())] * (threads // 4)
+            done += race(batch)
+            game.start_meeting()  # in case every start_meeting ran before the kill
+
+            # Everybody votes, some twice, while the timer ends the meeting
+            voters = alive() + alive(True)
+            batch = [("vote", game.vote, (random.choice(voters), random.choice(voters + [SKIP])))
+                     for _ in range(2 * len(voters))]
+            batch += [("end_meeting", game.end_meeting, ())] * 4
+            batch += [("status", game.status_snapshot, ())] * (threads // 4)
+            done += race(batch)
+            game.end_meeting()
+
+        if game.game_state == "running":
+            # The last task, the last kill and the impostors' ejection, all at once
+            with game.lock:
+                game.task_goal = game.total_tasks_done + threads // 4
+                game.impostor_win_kills = game.impostor_kill_count + 1
+            crew, impostors = alive(), alive(True)
+            batch = [("complete_task", game.complete_task, ())] * threads
+            batch += [("kill", game.kill, (random.choice(impostors), random.choice(crew))) for _ in range(threads)]
+            batch += [("eject", game.eject, (rfid,)) for rfid in impostors for _ in range(4)]
+            race(batch)
+        found.extend(contention_errors(watch.entries))
+        if found:
+            violations += 1
+            errors.extend(found)
+            print("invariant violated:", "; ".join(dict.fromkeys(found)))
+        game.scheduler.stop()
+
+    rows = {name: summarize(s, elapsed) for name, s in sorted(samples.items())}
+    print_rows("operation", rows)
+    print(f"games with invariant violations: {violations}/{games}")
+    return {"rows": rows, "violations": violations, "errors": errors}
+
+
+def bench_workers(workers=(1, 4), clients=32, requests=4000, connects=200, port=8765, processes=4):
+    """uvicorn --workers N on the sqlite backend: checks writes from every worker
+    land exactly once and are visible to every other, then measures /status throughput.
+
+    The load comes from `processes` client processes: a single Python client
+    saturates before a few workers do, and would hide any scaling. Compare the
+    workers against the client processes' CPU; on a machine with fewer cores
+    than both together, the numbers show contention, not scaling.
+    """
+    import httpx
+
+    rows = {}
+    violations = 0
+    for count in workers:
+        env = dict(os.environ, GAME_BACKEND="sqlite", GAME_DATA_DIR=tempfile.mkdtemp(prefix="amongus-workers-"))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(count),
+             "--log-level", "warning"], env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+        url = f"http://127.0.0.1:{port}"
+        try:
+            wait_for_port(server, port)
+            time.sleep(1)  # let every worker finish starting up
+
+            # One connection per request, so the kernel spreads them over the workers
+            def connect(i):
+                httpx.get(f"{url}/connect/W{i}/C{i}", headers={"Idempotency-Key": f"connect-{i}"})
+                status = httpx.get(url + "/status").json()
+                return f"W{i}" in status["players"]
+
+            with ThreadPoolExecutor(clients) as pool:
+                seen = list(pool.map(connect, range(connects)))
+                list(pool.map(connect, range(connects)))  # retries: must not add events
+            statuses = [httpx.get(url + "/status").json() for _ in range(count * 4)]
+            problems = []
+            if not all(seen):
+                problems.append(f"{seen.count(False)} connects not visible to the next request")
+            if any(len(s["players"]) != connects for s in statuses):
+                problems.append(f"player counts {sorted({len(s['players']) for s in statuses})} != {connects}")
+            if {s["version"] for s in statuses} != {connects}:
+                problems.append(f"versions {sorted({s['version'] for s in statuses})} != {connects}")
+            if problems:
+                violations += 1
+                print(f"{count} workers:", "; ".join(problems))
+
+            threads = max(1, clients // processes)
+            with ProcessPoolExecutor(processes) as pool:
+                results = list(pool.map(poll_status, [url] * processes, [threads] * processes,
+                                        [requests // processes] * processes))
+            samples = [ms for _, _, local in results for ms in local]
+            elapsed = max(end for _, end, _ in results) - min(start for start, _, _ in results)
+            rows[f"{count} workers, /status"] = summarize(samples, elapsed)
+        finally:
+            server.terminate()
+            server.wait()
+    print_rows("workers", rows)
+    print(f"worker counts with consistency violations: {violations}/{len(workers)}")
+    return {"rows": rows, "violations": violations}
+
+
+def bench_profiles(profiles=("dev", "prod"), displays=20, duration=10.0, poll_interval=0.5, port=8768):
+    """`python main.py <profile>` cold: time until it serves, then /status latency and RSS under display polling."""
+    import httpx
+
+    rows, startup, rss = {}, {}, {}
+    here = os.path.dirname(os.path.abspath(__file__))
+    for profile in profiles:
+        env = dict(os.environ, GAME_DATA_DIR=tempfile.mkdtemp(prefix="amongus-profile-"))
+        started = time.perf_counter()
+        server = subprocess.Popen([sys.executable, "main.py", profile, "--port", str(port)], env=env, cwd=here,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        url = f"http://127.0.0.1:{port}"
+        try:
+            wait_for_port(server, port)
+            startup[profile] = round(time.perf_counter() - started, 3)
+
+            samples = []
+            samples_lock = threading.Lock()
+            stop = time.perf_counter() + duration
+
+            def display():
+                local = []
+                with httpx.Client(base_url=url) as client:
+                    while time.perf_counter() < stop:
+                        start = time.perf_counter()
+                        client.get("/status")
+                        local.append((time.perf_counter() - start) * 1000)
+                        time.sleep(poll_interval)
+                with samples_lock:
+                    samples.extend(local)
+
+            threads = [threading.Thread(target=display) for _ in range(displays)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            rows[f"{profile}, /status"] = summarize(samples, duration)
+            rss[profile] = rss_mb(server.pid)  # the reloader's child process included
+        finally:
+            server.terminate()
+            server.wait()
+    print_rows("profile", rows)
+    for profile in profiles:
+        print(f"{profile:>22}  startup {startup[profile]:.3f} s, steady-state RSS {rss[profile]} MB")
+    return {"rows": rows, "startup_s": startup, "rss_mb": rss}
+
+
+def bench_coldstart(runs=10, profile="prod", port=8769):
+    """Fresh-process startup: `import main`, then a spawned server until /ready and its first /status."""
+    import httpx
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, GAME_DATA_DIR=tempfile.mkdtemp(prefix="amongus-coldstart-"))
+    samples = defaultdict(list)
+    started = time.perf_counter()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", "import time; t = time.perf_counter(); import main; "
+                              "print(time.perf_counter() - t)"], env=env, cwd=here, capture_output=True, text=True)
+        samples["import main"].append(float(out.stdout) * 1000)
+
+        spawned = time.perf_counter()
+        server = subprocess.Popen([sys.executable, "main.py", profile, "--port", str(port)], env=env, cwd=here,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(server, port)
+            with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+                while client.get("/ready").status_code != 200:
+                    time.sleep(0.005)
+                samples["spawn to /ready"].append((time.perf_counter() - spawned) * 1000)
+                client.get("/status").raise_for_status()
+                samples["spawn to first /status"].append((time.perf_counter() - spawned) * 1000)
+        finally:
+            server.terminate()
+            server.wait()
+    rows = {name: summarize(s, time.perf_counter() - started) for name, s in samples.items()}
+    print_rows("startup step (ms)", rows)
+    return {"rows": rows}
+
+
+# The list rendering the pages had before the keyed lists, for the dom scenario's comparison
+INNERHTML_RENDER = """
+game.handlers.status = [function(data){
+    document.getElementById('tasks-status').innerText = data.tasks_done + " / " + data.task_goal;
+    pendingEject = data.eject_selected;
+    const votes = data.votes || {};
+    document.getElementById('vote-status').innerText = data.meeting_active
+        ? `${data.votes_cast} vote(s), ${votes.skip || 0} to skip` : "No meeting";
+    let aliveHtml = '';
+    for(let [rfid,p] of Object.entries(data.players)){
+        if(p.alive){
+            let cls = (pendingEject===rfid) ? 'selected' : '';
+            const count = votes[rfid] ? ` (${votes[rfid]})` : '';
+            aliveHtml += `<button class="player-btn ${cls}" onclick="selectEject('${rfid}')">${p.color}${count}</button>`;
+        }
+    }
+    document.getElementById('alive-list').innerHTML = aliveHtml || "<p>No alive players</p>";
+    let deadHtml = '';
+    for(let [rfid,p] of Object.entries(data.players)){
+        if(!p.alive){
+            deadHtml += `<div class="player-dead">${p.color} - ${p.death_type.toUpperCase()}</div>`;
+        }
+    }
+    document.getElementById('dead-list').innerHTML = deadHtml || "<p>No deaths yet</p>";
+}];
+"""
+
+# A meeting, pushed one status at a time: a vote per update, a new eject pick
+# every 10th and an ejection every 25th. Returns per-update ms, render plus layout.
+DOM_UPDATES = """
+([players, updates]) => {
+    const status = {game_state: "running", tasks_done: 0, task_goal: 20, meeting_active: true,
+                    votes: {}, votes_cast: 0, eject_selected: null, players: {}};
+    for(let i = 0; i < players; i++){
+        status.players["P" + i] = {color: "C" + i, role: "crewmate", alive: true, death_type: null};
+    }
+    game.handlers.playerDied = [];  // no alerts or blinking mid-benchmark
+    game.emit('status', status, status.players);
+    document.body.offsetHeight;
+    const samples = [];
+    for(let i = 1; i <= updates; i++){
+        const rfid = "P" + (i * 7 % players), changed = {};
+        const votes = Object.assign({}, status.votes, {[rfid]: (status.votes[rfid] || 0) + 1});
+        Object.assign(status, {votes, votes_cast: status.votes_cast + 1, delta: true});
+        if(i % 10 === 0) status.eject_selected = "P" + (i % players);
+        if(i % 25 === 0){
+            changed[rfid] = Object.assign({}, status.players[rfid], {alive: false, death_type: "ejected"});
+            status.players = Object.assign({}, status.players, changed);
+        }
+        const start = performance.now();
+        game.emit('status', status, changed);
+        document.body.offsetHeight;  // force the layout the update caused
+        samples.push(performance.now() - start);
+    }
+    return samples;
+}
+"""
+DOM_METRICS = ("ScriptDuration", "LayoutDuration", "RecalcStyleDuration", "LayoutCount", "RecalcStyleCount")
+
+
+def bench_dom(players=(10, 100), updates=500, port=8770):
+    """Special logistics page in headless Chromium: per-update script, style and layout time, keyed vs innerHTML lists."""
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        sys.exit("the dom scenario needs playwright: pip install playwright && playwright install chromium")
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, GAME_DATA_DIR=tempfile.mkdtemp(prefix="amongus-dom-"))
+    server = subprocess.Popen([sys.executable, "main.py", "prod", "--port", str(port)], env=env, cwd=here,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    rows, metrics = {}, {}
+    try:
+        wait_for_port(server, port)
+        with sync_playwright() as pw:
+            browser = pw.chromium.launch()
+            for count in players:
+                for renderer in ("innerHTML", "keyed"):
+                    page = browser.new_page()
+                    page.goto(f"http://127.0.0.1:{port}/special-logistics")
+                    page.wait_for_function("game.status !== null")
+                    if renderer == "innerHTML":
+                        page.evaluate(INNERHTML_RENDER)
+                    cdp = page.context.new_cdp_session(page)
+                    cdp.send("Performance.enable")
+                    before = {m["name"]: m["value"] for m in cdp.send("Performance.getMetrics")["metrics"]}
+                    started = time.perf_counter()
+                    samples = page.evaluate(DOM_UPDATES, [count, updates])
+                    elapsed = time.perf_counter() - started
+                    after = {m["name"]: m["value"] for m in cdp.send("Performance.getMetrics")["metrics"]}
+                    name = f"{count} players, {renderer}"
+                    rows[name] = summarize(samples, elapsed)
+                    # Durations are in seconds; per update, in ms
+                    metrics[name] = {m: round((after[m] - before[m]) * (1 if m.endswith("Count") else 1000) / updates, 4)
+                                     for m in DOM_METRICS}
+                    page.close()
+            browser.close()
+    finally:
+        server.terminate()
+        server.wait()
+    print_rows("players, lists", rows)
+    print(f"{'per update':>22} " + " ".join(f"{m:>20}" for m in DOM_METRICS))
+    for name, row in metrics.items():
+        print(f"{name:>22} " + " ".join(f"{row[m]:>20}" for m in DOM_METRICS))
+    return {"rows": rows, "metrics": metrics}
+
+
+# ------------------------------
+# Baselines
+# ------------------------------
+def save_baseline(path, scenario, params, result):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"scenario": scenario, "params": params, **result}, f, indent=2)
+    print(f"saved baseline to {path}")
+
+
+def compare_baseline(path, scenario, result, tolerance=TOLERANCE):
+    """Prints this run against a saved baseline; returns the regressions found."""
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline["scenario"] != scenario:
+        sys.exit(f"{path} is a {baseline['scenario']} baseline, not {scenario}")
+
+    regressions = []
+    print(f"\ncompared to {path}:")
+    for name, row in result["rows"].items():
+        old = baseline["rows"].get(name)
+        if old is None:
+            continue
+        changes = []
+        # Lower is better for latency, higher for throughput
+        for metric, worse_if_higher in (("p50_ms", True), ("p99_ms", True), ("rps", False)):
+            if not old[metric]:
+                continue
+            change = (row[metric] - old[metric]) / old[metric]
+            changes.append(f"{metric} {old[metric]} -> {row[metric]} ({change:+.0%})")
+            if (change if worse_if_higher else -change) > tolerance:
+                regressions.append(f"{name} {metric}")
+        print(f"{name:>22}  " + ", ".join(changes))
+    if result.get("violations"):
+        regressions.append("invariant violations")
+    print("regressions: " + (", ".join(regressions) if regressions else "none"))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="scenario", required=True)
+
+    def scenario_parser(name, func, remote=True):
+        p = sub.add_parser(name, help=func.__doc__)
+        if remote:
+            p.add_argument("--url", help="benchmark a running server instead of main.app in-process")
+            p.add_argument("--server-pid", type=int, help="pid of the --url server, to report its CPU")
+        p.add_argument("--save", metavar="FILE", help="write the results as a baseline")
+        p.add_argument("--compare", metavar="FILE", help="compare against a saved baseline")
+        p.add_argument("--tolerance", type=float, default=TOLERANCE,
+                       help="relative slowdown that counts as a regression (default %(default)s)")
+        return p
+
+    room = scenario_parser("room", bench_room)
+    room.add_argument("--displays", type=int, default=20)
+    room.add_argument("--readers", type=int, default=10)
+    room.add_argument("--stations", type=int, default=4)
+    room.add_argument("--duration", type=float, default=10.0)
+    room.add_argument("--poll-interval", type=float, default=0.5)
+    room.add_argument("--players", type=int, default=10)
+
+    lobbies = scenario_parser("lobbies", bench_lobbies)
+    lobbies.add_argument("--counts", type=int, nargs="+", default=[1, 10, 100, 500])
+    lobbies.add_argument("--requests", type=int, default=2000)
+
+    taps = scenario_parser("taps", bench_taps)
+    taps.add_argument("--taps", type=int, default=500)
+    taps.add_argument("--batch", type=int, default=8)
+
+    roster = scenario_parser("roster", bench_roster, remote=False)
+    roster.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500, 1000])
+    roster.add_argument("--rounds", type=int, default=50)
+
+    contention = scenario_parser("contention", bench_contention, remote=False)
+    contention.add_argument("--games", type=int, default=50)
+    contention.add_argument("--threads", type=int, default=32)
+    contention.add_argument("--ops", type=int, default=3000)
+    contention.add_argument("--players", type=int, default=40)
+
+    workers = scenario_parser("workers", bench_workers, remote=False)
+    workers.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    workers.add_argument("--clients", type=int, default=32)
+    workers.add_argument("--requests", type=int, default=4000)
+    workers.add_argument("--connects", type=int, default=200)
+    workers.add_argument("--port", type=int, default=8765)
+    workers.add_argument("--processes", type=int, default=4, help="client processes generating the load")
+
+    profiles = scenario_parser("profiles", bench_profiles, remote=False)
+    profiles.add_argument("--profiles", nargs="+", default=["dev", "prod"])
+    profiles.add_argument("--displays", type=int, default=20)
+    profiles.add_argument("--duration", type=float, default=10.0)
+    profiles.add_argument("--poll-interval", type=float, default=0.5)
+    profiles.add_argument("--port", type=int, default=8768)
+
+    coldstart = scenario_parser("coldstart", bench_coldstart, remote=False)
+    coldstart.add_argument("--runs", type=int, default=10)
+    coldstart.add_argument("--profile", default="prod")
+    coldstart.add_argument("--port", type=int, default=8769)
+
+    dom = scenario_parser("dom", bench_dom, remote=False)
+    dom.add_argument("--players", type=int, nargs="+", default=[10, 100])
+    dom.add_argument("--updates", type=int, default=500)
+    dom.add_argument("--port", type=int, default=8770)
+
+    args = vars(parser.parse_args())
+    scenario = args.pop("scenario")
+    save, compare, tolerance = args.pop("save"), args.pop("compare"), args.pop("tolerance")
+    func = {"room": bench_room, "lobbies": bench_lobbies, "taps": bench_taps,
+            "roster": bench_roster, "contention": bench_contention, "workers": bench_workers,
+            "profiles": bench_profiles, "coldstart": bench_coldstart, "dom": bench_dom}[scenario]
+    result = func(**args)
+
+    if save:
+        save_baseline(save, scenario, args, result)
+    failed = bool(result.get("violations"))
+    if compare:
+        failed = bool(compare_baseline(compare, scenario, result, tolerance)) or failed
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,62 @@
+# File: clock.py
+"""Game time: integer nanoseconds that never jump.
+
+SystemClock reads time.monotonic_ns(), offset once at startup so that its
+readings are nanoseconds since the Unix epoch. Event logs, snapshots, /status
+and other workers on the same host can all use them, yet once the server is
+up an NTP step of the wall clock can't move a deadline: no free kill from a
+cooldown that ended early, no game timing out before its time.
+
+FakeClock only moves when told to, for the simulator and tests.
+"""
+import time
+from datetime import datetime
+
+
+NS = 1_000_000_000  # nanoseconds per second
+
+
+def seconds(value):
+    """A duration in seconds, as integer nanoseconds."""
+    return round(value * NS)
+
+
+class SystemClock:
+    def __init__(self):
+        self.offset = time.time_ns() - time.monotonic_ns()
+
+    def now(self):
+        return time.monotonic_ns() + self.offset
+
+
+class FakeClock:
+    def __init__(self, start=0):
+        self.t = start
+
+    def now(self):
+        return self.t
+
+    def advance_to(self, t):
+        """Moves to t (nanoseconds), never backwards."""
+        if t > self.t:
+            self.t = t
+
+    def advance(self, duration):
+        self.t += seconds(duration)
+
+
+system_clock = SystemClock()  # one per process, so every game reads the same time
+
+
+def epoch_ms(t):
+    """A clock reading as ms since the epoch, the unit of /clock and JavaScript's Date.now()."""
+    return None if t is None else t // 1_000_000
+
+
+def parse_time(value):
+    """A clock reading from a log or snapshot. Those written before this clock hold
+    ISO datetimes, and "never" as year 1."""
+    if value is None or isinstance(value, int):
+        return value
+    dt = datetime.fromisoformat(value)
+    return None if dt.year == 1 else round(dt.timestamp() * NS)
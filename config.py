@@ -0,0 +1,144 @@
+# File: config.py
+"""Server profiles and the game parameters file.
+
+    python main.py dev                       # auto-reload, access log
+    python main.py prod --config game.json   # no reloader, uvloop/httptools, tuned keep-alive
+    python main.py prod --workers 4          # several workers share state through the sqlite backend
+
+The config file is JSON with two optional sections; see config.example.json:
+
+    {"game":   {"game_duration": 600, "kill_cooldown": 75, ...},
+     "server": {"port": 8000, "workers": 1, ...}}
+
+"game" sets GameState parameters for every lobby; "server" overrides the
+profile's uvicorn settings. The path and the profile travel to the workers
+(and the reloader's child) in GAME_CONFIG and GAME_PROFILE, since each of
+them imports the app anew.
+"""
+import importlib.util
+import json
+import math
+import os
+
+from game import MAX_WHOLE_PARAMETER, WHOLE_PARAMETERS
+
+
+CONFIG_ENV = "GAME_CONFIG"
+PROFILE_ENV = "GAME_PROFILE"
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+# GameState attributes the "game" section may set; durations are in seconds
+GAME_PARAMETERS = (
+    "game_duration", "required_players", "kill_cooldown", "meeting_duration", "meeting_delay",
+    "impostor_ratio", "jester_ratio", "tasks_per_player", "win_kills_ratio",
+    "task_goal", "impostor_win_kills",  # fixed thresholds instead of the roster-scaled ones
+)
+
+
+def _installed(module):
+    return importlib.util.find_spec(module) is not None
+
+
+PROFILES = {
+    "dev": {
+        "host": "0.0.0.0",
+        "port": 8000,
+        "reload": True,
+        "workers": 1,
+        "log_level": "info",
+        "access_log": True,
+    },
+    "prod": {
+        "host": "0.0.0.0",
+        "port": 8000,
+        "reload": False,
+        "workers": 1,
+        "log_level": "warning",
+        "access_log": False,  # a log line per /status poll costs more than serving it
+        "loop": "uvloop" if _installed("uvloop") else "asyncio",
+        "http": "httptools" if _installed("httptools") else "h11",
+        # The readers keep one connection open between taps (HTTPClient setReuse);
+        # uvicorn's default of 5 s would close it between most of them
+        "timeout_keep_alive": 75,
+    },
+}
+
+
+def load_config(path=None):
+    """The parsed config file: `path`, else $GAME_CONFIG, else config.json if it exists; {} if none."""
+    path = path or os.environ.get(CONFIG_ENV) or (DEFAULT_CONFIG if os.path.exists(DEFAULT_CONFIG) else None)
+    if not path:
+        return {}
+    with open(path) as f:
+        config = json.load(f)
+    unknown = set(config.get("game", {})) - set(GAME_PARAMETERS)
+    if unknown:
+        raise ValueError(f"{path}: unknown game parameters {', '.join(sorted(unknown))}")
+    if "game" in config:
+        config["game"] = {name: _game_parameter(path, name, value) for name, value in config["game"].items()}
+    return config
+
+
+def _game_parameter(path, name, value):
+    """`value` as GameState takes it; raises ValueError rather than let a bad one reach a game."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+        raise ValueError(f"{path}: game parameter {name} must be a number >= 0, not {value!r}")
+    if name in WHOLE_PARAMETERS:
+        if value != int(value) or value > MAX_WHOLE_PARAMETER:
+            raise ValueError(f"{path}: game parameter {name} must be a whole number "
+                             f"up to {MAX_WHOLE_PARAMETER}, not {value!r}")
+        return int(value)
+    return value
+
+
+def game_settings():
+    """The "game" section of the config file, for LobbyRegistry."""
+    return load_config().get("game", {})
+
+
+def server_settings(profile, config_path=None, **overrides):
+    """uvicorn.run() keyword arguments: the profile, then the file's "server" section, then `overrides`."""
+    settings = dict(PROFILES[profile])
+    settings.update(load_config(config_path).get("server", {}))
+    settings.update({name: value for name, value in overrides.items() if value is not None})
+    if settings["workers"] > 1:
+        if settings["reload"]:
+            raise ValueError("reload runs a single worker; use the prod profile for --workers")
+        # Separate processes only see each other's games through the shared backend
+        if os.environ.setdefault("GAME_BACKEND", "sqlite") != "sqlite":
+            raise ValueError("several workers need GAME_BACKEND=sqlite")
+    if config_path:
+        os.environ[CONFIG_ENV] = os.path.abspath(config_path)
+    os.environ[PROFILE_ENV] = profile
+    return settings
+
+
+def launched_profile():
+    """The profile `python main.py` started this process with; None under a plain `uvicorn main:app`."""
+    return os.environ.get(PROFILE_ENV)
+
+
+def launch(argv=None):
+    """`python main.py [profile] [options]`. Runs before the app is imported, so the backend,
+    the config file and the profile are all in the environment when it is built."""
+    import argparse
+    import uvicorn  # only the CLI needs it; `uvicorn main:app` and the benchmarks import main without it
+
+    parser = argparse.ArgumentParser(prog="main.py", description="Run the game server.")
+    parser.add_argument("profile", nargs="?", choices=sorted(PROFILES), default="dev",
+                        help="dev: auto-reload and access log; prod: tuned for real games (default dev)")
+    parser.add_argument("--config", help="JSON file with game parameters and server settings")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(argv)
+    try:
+        settings = server_settings(args.profile, args.config, host=args.host, port=args.port, workers=args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    if settings["workers"] > 1 or settings["reload"]:
+        # Each worker (or the reloader's child) imports the app itself, from this environment
+        uvicorn.run("main:app", **settings)
+    else:
+        import main
+        uvicorn.run(main.app, **settings)
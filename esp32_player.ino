@@ -16,15 +16,35 @@ MFRC522 mfrc522(SS_PIN, RST_PIN);
 String playerId = "PLAYER1";   // <-- change for each device
 String playerColor = "Red";    // <-- change for each device
 
+// Reader protocol state; taps wait here until the server acknowledges them
+#define ACTION_CONNECT 1
+#define ACTION_KILL 2
+#define MAX_QUEUED 16
+
+struct Tap {
+  uint16_t seq;
+  uint8_t action;
+  uint8_t len;
+  uint8_t data[16];
+};
+
+Tap queue[MAX_QUEUED];
+int queued = 0;
+uint16_t nextSeq = 0;
+unsigned long lastFlushAttempt = 0;
+WiFiClient net;   // kept open between requests
+HTTPClient http;
+
 void setup() {
   Serial.begin(115200);
   SPI.begin();
   mfrc522.PCD_Init();
 
   connectWiFi();
+  nextSeq = esp_random();  // so sequence numbers don't repeat across reboots
 
   // Register this player with server (retry until success)
-  registerWithServer(playerId, playerColor);
+  registerWithServer(playerColor);
 }
 
 void loop() {
@@ -34,23 +54,18 @@ void loop() {
     connectWiFi();
   }
 
+  // Taps that didn't go through are resent together as one batch
+  if (queued > 0 && millis() - lastFlushAttempt > 1000) flushTaps();
+
   // Wait for RFID scan
   if (!mfrc522.PICC_IsNewCardPresent() || !mfrc522.PICC_ReadCardSerial())
     return;
 
-  // Get scanned RFID (impostor)
-  String impostor = "";
-  for (byte i = 0; i < mfrc522.uid.size; i++) {
-    if (mfrc522.uid.uidByte[i] < 0x10) impostor += "0"; // leading zero
-    impostor += String(mfrc522.uid.uidByte[i], HEX);
-  }
-
-  impostor.toUpperCase();
+  Serial.println("Scanned impostor card");
 
-  Serial.println("Scanned impostor card: " + impostor);
-
-  // Try to kill THIS player (with retries)
-  doKill(impostor, playerId);
+  // Kill THIS player; the raw card UID goes straight into the frame
+  queueTap(ACTION_KILL, mfrc522.uid.uidByte, mfrc522.uid.size);
+  flushTaps();
 
   delay(1000);
 }
@@ -80,51 +95,75 @@ void connectWiFi() {
 //impostor = impostor.toUpperCase();
 
 // Register function
-void registerWithServer(String rfid, String color) {
-  bool success = false;
-
-  while (!success) {
-    if (WiFi.status() != WL_CONNECTED) connectWiFi();
-
-    HTTPClient http;
-    http.begin(SERVER_URL + "/connect/" + rfid + "/" + color);  // ✅ path params
-    int httpCode = http.GET();
-    if (httpCode == 200) {
-      String payload = http.getString();
-      Serial.println("✅ Player registered with server: " + rfid + " | " + color);
-      Serial.println(payload);
-      success = true;
-    } else {
-      Serial.println("❌ Failed to register player, retrying in 3s...");
-      delay(3000);
-    }
-    http.end();
+void registerWithServer(String color) {
+  queueTap(ACTION_CONNECT, (const uint8_t*)color.c_str(), color.length());
+  while (!flushTaps()) {
+    Serial.println("❌ Failed to register player, retrying in 3s...");
+    delay(3000);
+  }
+  Serial.println("✅ Player registered with server: " + playerId + " | " + color);
+}
+
+// ---------------------------
+// Reader protocol (see reader.py on the server)
+// ---------------------------
+// Taps are binary frames POSTed over one kept-alive connection. Each tap has
+// a sequence number, so a batch resent after a lost reply is applied once.
+void queueTap(uint8_t action, const uint8_t* data, uint8_t len) {
+  if (queued == MAX_QUEUED) {  // drop the oldest tap
+    memmove(queue, queue + 1, sizeof(Tap) * (MAX_QUEUED - 1));
+    queued--;
   }
+  Tap& tap = queue[queued++];
+  tap.seq = nextSeq++;
+  tap.action = action;
+  tap.len = min(len, (uint8_t)sizeof(tap.data));
+  memcpy(tap.data, data, tap.len);
 }
 
-// Kill function
-void doKill(String impostor, String target) {
+// Sends every queued tap in one frame; returns true once they are acknowledged
+bool flushTaps() {
+  lastFlushAttempt = millis();
+  if (queued == 0) return true;
   if (WiFi.status() != WL_CONNECTED) connectWiFi();
 
-  bool success = false;
-  int retries = 3;
-
-  for (int i = 0; i < retries && !success; i++) {
-    HTTPClient http;
-    http.begin(SERVER_URL + "/kill/" + impostor + "/" + target);
-    http.addHeader("Content-Type", "application/json");
-    int httpCode = http.POST("{}");  // ✅ empty JSON
-    if (httpCode == 200) {
-      String payload = http.getString();
-      Serial.println("Kill result: " + payload);
-      success = true;
-    } else {
-      Serial.println("Kill request failed (attempt " + String(i+1) + ")");
-      delay(1000);
-      if (WiFi.status() != WL_CONNECTED) connectWiFi();
-    }
+  uint8_t frame[3 + 32 + MAX_QUEUED * (4 + sizeof(Tap::data))];
+  int n = 0;
+  frame[n++] = 1;  // protocol version
+  frame[n++] = playerId.length();
+  memcpy(frame + n, playerId.c_str(), playerId.length());
+  n += playerId.length();
+  frame[n++] = queued;
+  for (int i = 0; i < queued; i++) {
+    frame[n++] = queue[i].seq & 0xFF;
+    frame[n++] = queue[i].seq >> 8;
+    frame[n++] = queue[i].action;
+    frame[n++] = queue[i].len;
+    memcpy(frame + n, queue[i].data, queue[i].len);
+    n += queue[i].len;
+  }
+
+  http.setReuse(true);
+  http.begin(net, SERVER_URL + "/reader");
+  http.addHeader("Content-Type", "application/octet-stream");
+  int httpCode = http.POST(frame, n);
+  if (httpCode != 200) {
+    Serial.println("Tap frame failed (" + String(httpCode) + "), " + String(queued) + " tap(s) queued");
     http.end();
+    return false;
   }
 
-  if (!success) Serial.println("❌ Kill request ultimately failed after retries.");
+  // Ack frame: version, count, then per tap: seq (2), status, text length, text
+  uint8_t ack[512];
+  int size = http.getStreamPtr()->readBytes(ack, min(http.getSize(), (int)sizeof(ack)));
+  http.end();
+  for (int i = 2, count = 0; count < ack[1] && i + 4 <= size; count++) {
+    uint8_t status = ack[i + 2], len = ack[i + 3];
+    String text = "";
+    for (int j = 0; j < len && i + 4 + j < size; j++) text += (char)ack[i + 4 + j];
+    Serial.println(String((status & 0x7F) == 0 ? "Tap ok: " : "Tap rejected: ") + text);
+    i += 4 + len;
+  }
+  queued = 0;
+  return true;
 }
@@ -0,0 +1,161 @@
+# File: eventlog.py
+import json
+import logging
+import os
+import threading
+import time
+
+
+FLUSH_INTERVAL = 0.02   # seconds between group commits (one write + fsync for everything buffered)
+SNAPSHOT_EVERY = 1000   # events between snapshots; keeps replay short
+
+logger = logging.getLogger(__name__)
+
+
+class EventLog:
+    """Append-only JSON-lines log of one game's events, plus a snapshot for fast replay.
+
+    append() only buffers the event in memory, so it adds no I/O to the request
+    path; the shared flusher thread writes and fsyncs all buffered events every
+    FLUSH_INTERVAL. Every SNAPSHOT_EVERY events the owner's state is written to
+    `<path>.snap` and the log restarts empty.
+    """
+
+    shared = False  # only this process writes it; see backend.SharedLog
+
+    def __init__(self, path, snapshot_source=None):
+        self.path = path
+        self.snapshot_path = path + ".snap"
+        self.snapshot_source = snapshot_source  # callable -> (seq, state dict)
+        self.buffer = []  # (seq, line)
+        self.buffer_lock = threading.Lock()
+        self.io_lock = threading.Lock()
+        self.file = None
+        self.since_snapshot = 0
+
+    def append(self, seq, event):
+        line = json.dumps({"seq": seq, **event}, separators=(",", ":"))
+        with self.buffer_lock:
+            self.buffer.append((seq, line))
+
+    def load(self):
+        """Returns (snapshot or None, events logged after it) from disk.
+
+        A snapshot is {"seq": last event it covers, "state": owner's state}.
+        """
+        snapshot, seq = None, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            seq = snapshot["seq"]
+        events = []
+        if os.path.exists(self.path):
+            good = 0
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn final write from a crash
+                    event = json.loads(line)
+                    good += len(line)
+                    if event["seq"] > seq:
+                        events.append(event)
+            if good != os.path.getsize(self.path):
+                os.truncate(self.path, good)  # so new appends don't land after the torn line
+        self.since_snapshot = len(events)
+        return snapshot, events
+
+    def flush(self):
+        with self.io_lock:
+            with self.buffer_lock:
+                pending, self.buffer = self.buffer, []
+            if not pending:
+                return
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self.file = open(self.path, "a")
+            self.file.write("".join(line + "\n" for _, line in pending))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.since_snapshot += len(pending)
+        if self.since_snapshot >= SNAPSHOT_EVERY and self.snapshot_source:
+            self.snapshot()
+
+    def snapshot(self):
+        """Writes the owner's current state and starts a fresh, empty log after it."""
+        with self.io_lock:
+            seq, state = self.snapshot_source()
+            with self.buffer_lock:
+                self.buffer = [(s, line) for s, line in self.buffer if s > seq]
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.snapshot_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"seq": seq, "state": state}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            if self.file is not None:
+                self.file.close()
+            self.file = open(self.path, "w")  # everything logged so far is in the snapshot
+            self.since_snapshot = 0
+
+    def close(self):
+        """Flushes, snapshots and stops flushing this log."""
+        flusher.remove(self)
+        self.flush()
+        if self.snapshot_source:
+            self.snapshot()
+        with self.io_lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def delete(self):
+        """Stops flushing and removes the log and snapshot files."""
+        flusher.remove(self)
+        with self.io_lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            for path in (self.path, self.snapshot_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+class Flusher(threading.Thread):
+    """One background thread doing the group commits for every open log."""
+
+    def __init__(self):
+        super().__init__(name="eventlog-flusher", daemon=True)
+        self.logs = set()
+        self.lock = threading.Lock()
+
+    def add(self, log):
+        with self.lock:
+            self.logs.add(log)
+            if not self.is_alive():
+                self.start()
+
+    def remove(self, log):
+        with self.lock:
+            self.logs.discard(log)
+
+    def run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            with self.lock:
+                logs = list(self.logs)
+            for log in logs:
+                try:
+                    log.flush()
+                except Exception:  # one failing log must not stop the commits of the others
+                    logger.exception("Failed to flush %s", log.path)
+
+
+flusher = Flusher()
+
+
+def open_log(path, snapshot_source=None):
+    """Opens an EventLog and registers it with the background flusher."""
+    log = EventLog(path, snapshot_source)
+    flusher.add(log)
+    return log
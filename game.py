@@ -0,0 +1,922 @@
+# File: game.py
+import functools
+import json
+import random
+import secrets
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from clock import NS, epoch_ms, parse_time, seconds, system_clock
+from metrics import STATUS_SERIALIZE, TIMER_LAG
+
+
+colors = ["Red", "Blue", "Green", "Yellow", "Orange", "Pink", "Purple", "Cyan", "White", "Lime"]
+
+
+def player_color(index):
+    """A distinct color name for the index-th player: the 10 colors, then "Red 2", "Blue 2", ..."""
+    color = colors[index % len(colors)]
+    return color if index < len(colors) else f"{color} {index // len(colors) + 1}"
+
+TIMER_SLACK = NS // 2  # how early a scheduled transition may fire and still count as due
+
+LCD_WIDTH = 16  # characters per line on the role reveal reader's 16x2 LCD
+
+
+def lcd_text(*lines):
+    """Fixed-width LCD text: every line cut or padded to LCD_WIDTH, concatenated."""
+    return "".join(line[:LCD_WIDTH].ljust(LCD_WIDTH) for line in lines)
+
+
+UNKNOWN_CARD = lcd_text("Unknown Card", "")
+
+SKIP = "skip"  # vote target for "eject nobody"
+
+# Counts, and durations the analytics store keeps as 16-bit integers
+WHOLE_PARAMETERS = ("game_duration", "required_players", "meeting_duration", "task_goal", "impostor_win_kills")
+MAX_WHOLE_PARAMETER = 65535
+
+
+
+# ------------------------------
+# Game Clock Scheduler
+# ------------------------------
+class GameScheduler:
+    """Runs the timed game transitions on the server's event loop.
+
+    Jobs are keyed by name; scheduling a name again replaces the pending job.
+    schedule()/cancel_all() may be called from the threadpool handlers.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.jobs = {}  # name -> asyncio.TimerHandle
+
+    def start(self, loop):
+        self.loop = loop
+
+    def stop(self):
+        self._cancel_all()
+        self.loop = None
+
+    def schedule(self, name, delay, callback):
+        if self.loop is None:
+            return
+        when = self.loop.time() + delay
+        self.loop.call_soon_threadsafe(self._arm, name, when, callback)
+
+    def cancel_all(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._cancel_all)
+
+    def _arm(self, name, when, callback):
+        if name in self.jobs:
+            self.jobs.pop(name).cancel()
+        self.jobs[name] = self.loop.call_at(when, self._run, name, when, callback)
+
+    def _run(self, name, when, callback):
+        TIMER_LAG.observe(self.loop.time() - when, name)
+        self.jobs.pop(name, None)
+        # Off the loop: with a shared backend the transition may wait for the database's write lock
+        self.loop.run_in_executor(None, callback)
+
+    def _cancel_all(self):
+        for handle in self.jobs.values():
+            handle.cancel()
+        self.jobs.clear()
+
+
+# ------------------------------
+# Players
+# ------------------------------
+class Player:
+    """One connected player card. Only Roster should mutate it.
+
+    Times are clock readings (integer ns, see clock.py); kill_ready is when
+    the player's kill cooldown ends, 0 if it has never killed.
+    """
+
+    __slots__ = ("rfid", "color", "role", "alive", "kill_ready", "death_type", "death_time", "_json")
+
+    def __init__(self, rfid, color, role="Crewmate"):
+        self.rfid = rfid
+        self.color = color
+        self.role = role
+        self.alive = True
+        self.kill_ready = 0
+        self.death_type = None
+        self.death_time = None
+        self._json = None
+
+    def to_json(self):
+        """The player's /status entry, cached until the player changes."""
+        if self._json is None:
+            data = {"color": self.color, "role": self.role, "alive": self.alive}
+            if self.kill_ready:
+                data["kill_ready_at"] = epoch_ms(self.kill_ready)
+            if self.death_time is not None:
+                data["death_time"] = epoch_ms(self.death_time)
+            if self.death_type:
+                data["death_type"] = self.death_type
+            self._json = data
+        return self._json
+
+
+class Roster:
+    """Players by RFID, with counters kept in step with every role and death change.
+
+    alive:  alive players per role
+    dead:   dead players per death type
+    kills:  kills per impostor RFID
+    """
+
+    def __init__(self):
+        self.players = {}
+        self.alive = Counter()
+        self.dead = Counter()
+        self.kills = Counter()
+
+    def __contains__(self, rfid):
+        return rfid in self.players
+
+    def __getitem__(self, rfid):
+        return self.players[rfid]
+
+    def __len__(self):
+        return len(self.players)
+
+    def __iter__(self):
+        return iter(self.players)
+
+    def values(self):
+        return self.players.values()
+
+    def items(self):
+        return self.players.items()
+
+    def add(self, rfid, color):
+        player = self.players[rfid] = Player(rfid, color)
+        self.alive[player.role] += 1
+        return player
+
+    def set_role(self, rfid, role):
+        player = self.players[rfid]
+        if player.alive:
+            self.alive[player.role] -= 1
+            self.alive[role] += 1
+        player.role = role
+        player._json = None
+
+    def mark_dead(self, rfid, death_type, when=None):
+        player = self.players[rfid]
+        if player.alive:
+            self.alive[player.role] -= 1
+            self.dead[death_type] += 1
+        player.alive = False
+        player.death_type = death_type
+        if when is not None:
+            player.death_time = when
+        player._json = None
+
+    def record_kill(self, impostor, ready):
+        """Counts a kill; the impostor can kill again at `ready`."""
+        player = self.players[impostor]
+        player.kill_ready = ready
+        self.kills[impostor] += 1
+        player._json = None
+
+    def revive_all(self):
+        """Brings every player back alive with no role, kills or death info."""
+        for player in self.players.values():
+            player.role = None
+            player.alive = True
+            player.kill_ready = 0
+            player.death_type = None
+            player.death_time = None
+            player._json = None
+        self.alive = Counter({None: len(self.players)})
+        self.dead.clear()
+        self.kills.clear()
+
+    def load(self, rows):
+        """Replaces the roster with (rfid, color, role, alive, kill_ready, death_type, death_time, kills) rows."""
+        self.players = {}
+        self.alive, self.dead, self.kills = Counter(), Counter(), Counter()
+        for rfid, color, role, alive, kill_ready, death_type, death_time, kills in rows:
+            player = self.players[rfid] = Player(rfid, color, role)
+            player.alive = alive
+            player.kill_ready = kill_ready
+            player.death_type = death_type
+            player.death_time = death_time
+            if alive:
+                self.alive[role] += 1
+            else:
+                self.dead[death_type] += 1
+            if kills:
+                self.kills[rfid] = kills
+
+    def to_json(self):
+        return {rfid: player.to_json() for rfid, player in self.players.items()}
+
+
+# ------------------------------
+# Game State
+# ------------------------------
+def transition(method):
+    """Runs a GameState method atomically and notifies listeners if it changed the state."""
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        with self.writing() as version:
+            result = method(self, *args)
+            changed = self.version != version
+        if changed and self.on_change:
+            self.on_change()
+        return result
+    return wrapper
+
+
+class GameState:
+    """One game: players, roles, tasks and meetings.
+
+    Every mutation goes through a @transition method, which holds `lock` for
+    the whole read-modify-write. A transition validates the request, then
+    records what happened as an event: _apply() mutates the state and bumps
+    `version`, and the event is appended to the durable log if there is one.
+    Replaying the log through _apply() rebuilds the state after a restart.
+    With a shared log (backend.SharedLog) several workers run the same game:
+    transitions hold the log's write lock and reads catch up with it first.
+    A transition waits for that write lock before it takes `lock`, so reads
+    carry on while another worker writes.
+    Status serialization only holds the lock long enough to copy the state.
+    """
+
+    def __init__(self, scheduler=None, on_change=None, log=None, clock=None, lobby_id=""):
+        self.lock = threading.RLock()
+        self.write_lock = threading.RLock()  # shared log: this worker's transitions, in turn, while they wait for it
+        self.cache_lock = threading.Lock()
+        self.scheduler = scheduler or GameScheduler()
+        self.clock = clock or system_clock  # clock.FakeClock in the simulator
+        self.rng = random.Random()  # draws the roles; seeded for reproducible simulations
+        self.on_change = on_change  # called after every change
+        self.log = log
+        self.analytics = None  # RoundRecorder fed with every new event, if the lobby keeps analytics
+
+        self.players = Roster()
+        self.game_state = "waiting"  # waiting / running / ended
+        self.game_start_time = None  # clock readings, like every time in the game (see clock.py)
+        self.game_ends = None        # deadline: the game is a draw if it's still running then
+        self.game_winner = None  # None / "crewmates" / "impostors" / "jester" / "draw"
+        self.win_announced = False
+
+        # Game parameters
+        self.game_duration = 600  # seconds
+        self.required_players = None  # most players a game can start with; None for no cap
+        self.kill_cooldown = seconds(75)
+        self.impostor_kill_count = 0
+
+        # Role mix and win thresholds, as fractions of the roster so they scale
+        # with it; 10 players get 2 impostors, 1 jester, 6 tasks and 5 kills to win
+        self.impostor_ratio = 0.2
+        self.jester_ratio = 0.1
+        self.tasks_per_player = 0.6
+        self.win_kills_ratio = 0.5
+        self.task_goal = 6            # set from the roster size on every reset
+        self.impostor_win_kills = 5   # likewise
+        self.fixed_thresholds = {}    # task_goal / impostor_win_kills from the config file, not scaled
+
+        # Meeting state
+        self.meeting_active = False
+        self.meeting_start_time = None
+        self.meeting_ends = None
+        self.meeting_duration = 50  # seconds
+        self.meeting_delay = 6      # seconds after death
+        self.meeting_pending = False  # a kill has scheduled a meeting that hasn't started yet
+        self.meeting_due = None       # when the pending meeting starts
+        self.pre_meeting_alert = False
+        self.pending_eject_rfid = None  # the moderator's pick; overrides the vote when the meeting ends
+
+        # Votes of the current meeting: voter -> target, and votes per target kept in step
+        # (target is an rfid or SKIP). Resolved by end_meeting, on the scheduler.
+        self.votes = {}
+        self.tally = Counter()
+
+        self.total_tasks_done = 0
+
+        # Role reveal table: rfid -> LCD text, rebuilt whenever roles are assigned
+        self.role_reveal = {}
+
+        # Status cache
+        self.version = 0                             # bumped by every event
+        self.lobby_id = lobby_id
+        # ETags are "<lobby>:<epoch>:<version>": versions restart at 0 in every lobby and every
+        # new game, so a recreated lobby must not answer another's If-None-Match with a 304
+        self.etag_prefix = f"{lobby_id}:{secrets.token_hex(4)}"
+        self.status_cache = (None, None, None, None)  # (version, etag, serialized body, snapshot dict)
+        self.status_changes = deque(maxlen=128)       # (base version, version, changed rfids, changed fields)
+        self.delta_cache = {}                         # (cache key, since) -> (version, etag, body)
+
+    def configure(self, **params):
+        """Sets game parameters, e.g. from the config file; durations are in seconds."""
+        for name, value in params.items():
+            if not hasattr(self, name):
+                raise ValueError(f"unknown game parameter {name!r}")
+            if name in WHOLE_PARAMETERS and value is not None:
+                if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                        or not 0 <= value <= MAX_WHOLE_PARAMETER or value != int(value):
+                    raise ValueError(f"game parameter {name} must be a whole number up to "
+                                     f"{MAX_WHOLE_PARAMETER}, not {value!r}")
+                value = int(value)
+            if name == "kill_cooldown":
+                value = seconds(value)
+            elif name in ("task_goal", "impostor_win_kills"):
+                self.fixed_thresholds[name] = value
+            setattr(self, name, value)
+
+    # ------------------------------
+    # Events (call with the lock held)
+    # ------------------------------
+    def _emit(self, event_type, now=None, **data):
+        """Applies an event and appends it to the log."""
+        if now is None:
+            now = self.clock.now()
+        event = {"type": event_type, "t": now, **data}
+        self._apply(event)
+        if self.log is not None:
+            self.log.append(self.version, event)
+        if self.analytics is not None:
+            self.analytics.record(self, event, now)
+
+    @contextmanager
+    def writing(self):
+        """Holds `lock` around a transition; yields the version it started from. With a
+        shared log, first takes the log's write lock, without holding `lock` while it waits
+        for other workers, then applies what they wrote, so the transition validates
+        against the latest state."""
+        log = self.log
+        if log is None or not log.shared:
+            with self.lock:
+                yield self.version
+            return
+        with self.write_lock, log.transaction(), self.lock:
+            version = self.version
+            self._follow(*log.changes(self.version))
+            yield version
+
+    def sync(self):
+        """Applies the events other workers added to a shared log; a no-op otherwise."""
+        log = self.log
+        if log is None or not log.shared or log.head() <= self.version:
+            return
+        with self.lock:
+            changed = self._follow(*log.changes(self.version))
+        if changed and self.on_change:
+            self.on_change()
+
+    def _follow(self, snapshot, events):
+        """Applies another worker's snapshot and events, then re-arms the timers
+        from the result; returns True if there were any. Call with the lock held."""
+        if snapshot is None and not events:
+            return False
+        if snapshot is not None:
+            self._load_state(snapshot["seq"], snapshot["state"])
+        for event in events:
+            self._apply(event)
+            self.version = event["seq"]
+            if self.analytics is not None:
+                self.analytics.record(self, event, parse_time(event["t"]), live=False)
+        self.scheduler.cancel_all()
+        self._resume_timers()
+        return True
+
+    def _apply(self, event):
+        getattr(self, "_apply_" + event["type"])(event, parse_time(event["t"]))
+        self.version += 1
+
+    def _apply_connect(self, event, now):
+        self.players.add(event["rfid"], event["color"])
+        self.role_reveal[event["rfid"]] = self._role_lcd(self.players[event["rfid"]])
+
+    def _apply_start(self, event, now):
+        self.game_state = "running"
+        self.game_start_time = now
+        self.game_ends = now + seconds(self.game_duration)
+
+    def _apply_reset(self, event, now):
+        self._reset()
+        for rfid, role in event["roles"].items():
+            self.players.set_role(rfid, role)
+        # Logs written before thresholds scaled don't carry them
+        self.task_goal = event.get("task_goal", self.task_goal)
+        self.impostor_win_kills = event.get("impostor_win_kills", self.impostor_win_kills)
+        self._build_role_reveal()
+
+    def _apply_kill(self, event, now):
+        self.players.mark_dead(event["target"], "killed", now)
+        self.players.record_kill(event["impostor"], now + self.kill_cooldown)
+        self.impostor_kill_count += 1
+        self.pre_meeting_alert = True
+        # Only the first kill before a meeting schedules it
+        if not self.meeting_pending:
+            self.meeting_pending = True
+            self.meeting_due = now + seconds(self.meeting_delay)
+        self._check_win_conditions(now)
+
+    def _apply_eject(self, event, now):
+        self._eject(event["rfid"], now)
+
+    def _apply_task(self, event, now):
+        self.total_tasks_done += 1
+        self._check_win_conditions(now)
+
+    def _apply_set_eject(self, event, now):
+        self.pending_eject_rfid = event["rfid"]
+
+    def _apply_process_eject(self, event, now):
+        rfid = self.pending_eject_rfid
+        self.pending_eject_rfid = None
+        if self.players[rfid].alive:
+            self._eject(rfid, now)
+
+    def _apply_meeting_start(self, event, now):
+        self.meeting_pending = False  # reset so future kills can trigger again
+        self.meeting_due = None
+        self._clear_votes()
+        if self.game_state == "running":
+            self.pre_meeting_alert = False
+            self.meeting_active = True
+            self.meeting_start_time = now
+            self.meeting_ends = now + seconds(self.meeting_duration)
+
+    def _apply_meeting_end(self, event, now):
+        self.meeting_active = False
+        self.meeting_start_time = None
+        self.meeting_ends = None
+        self.pending_eject_rfid = None
+        self._clear_votes()
+        rfid = event.get("ejected")  # logs from before server-side votes don't carry it
+        if rfid and self.players[rfid].alive and self.game_state == "running":
+            self._eject(rfid, now)
+
+    def _apply_vote(self, event, now):
+        voter, target = event["voter"], event["target"]
+        previous = self.votes.get(voter)
+        if previous is not None:
+            self.tally[previous] -= 1
+        self.votes[voter] = target
+        self.tally[target] += 1
+
+    def _apply_timeout(self, event, now):
+        self._check_win_conditions(now)
+        if self.game_state == "running":
+            self._end("draw")
+
+    # ------------------------------
+    # Helpers (call with the lock held)
+    # ------------------------------
+    def _assign_roles(self):
+        """Picks roles for the whole roster in one pass: impostor_ratio impostors
+        (at least one), jester_ratio jesters, the rest crewmates."""
+        rfids = list(self.players)
+        count = len(rfids)
+        impostors = min(count, max(1, round(count * self.impostor_ratio)))
+        jesters = min(count - impostors, round(count * self.jester_ratio))
+        self.rng.shuffle(rfids)
+        return {rfid: "impostor" if i < impostors else "jester" if i < impostors + jesters else "crewmate"
+                for i, rfid in enumerate(rfids)}
+
+    def _scaled_thresholds(self):
+        """The task goal and impostor kill target for the current roster size."""
+        count = len(self.players)
+        return {"task_goal": max(1, round(count * self.tasks_per_player)),
+                "impostor_win_kills": max(1, round(count * self.win_kills_ratio)),
+                **self.fixed_thresholds}
+
+    @staticmethod
+    def _role_lcd(player):
+        return lcd_text(player.color, (player.role or "Unknown").upper())
+
+    def _build_role_reveal(self):
+        # A new dict rather than updating in place, so lock-free readers never see a half-built table
+        self.role_reveal = {rfid: self._role_lcd(p) for rfid, p in self.players.items()}
+
+    def _reset(self):
+        """Resets the game to its initial waiting state."""
+        self.players.revive_all()
+        self.game_state = "waiting"
+        self.total_tasks_done = 0
+        self.game_start_time = None
+        self.game_ends = None
+        self.game_winner = None
+        self.win_announced = False
+        self.meeting_active = False
+        self.meeting_start_time = None
+        self.meeting_ends = None
+        self.meeting_pending = False
+        self.meeting_due = None
+        self.pre_meeting_alert = False
+        self.pending_eject_rfid = None
+        self._clear_votes()
+        self.impostor_kill_count = 0
+
+    def _clear_votes(self):
+        self.votes = {}
+        self.tally = Counter()
+
+    def _meeting_result(self):
+        """Who the meeting ejects: the moderator's pick if there is one, else the
+        alive player with strictly the most votes, if that beats skip; else None."""
+        if self.pending_eject_rfid:
+            return self.pending_eject_rfid
+        counts = sorted(((n, target) for target, n in self.tally.items()
+                         if n and (target == SKIP or self.players[target].alive)), reverse=True)
+        if not counts or counts[0][1] == SKIP or (len(counts) > 1 and counts[1][0] == counts[0][0]):
+            return None
+        return counts[0][1]
+
+    def _check_win_conditions(self, now):
+        if self.game_state != "running":
+            return
+
+        # If jester already won, skip checks
+        if self.game_winner == "jester":
+            return
+
+        if self.total_tasks_done >= self.task_goal or self.players.alive["impostor"] == 0:
+            self._end("crewmates")
+        elif self.impostor_kill_count >= self.impostor_win_kills:
+            self._end("impostors")
+        elif self.game_ends is not None and now >= self.game_ends:
+            self._end("draw")
+
+    def _end(self, winner):
+        self.game_state = "ended"
+        self.game_winner = winner
+        self.win_announced = True
+
+    def _eject(self, rfid, now):
+        self.players.mark_dead(rfid, "ejected")
+        # If jester is ejected → jester wins immediately
+        if self.players[rfid].role == "jester":
+            self._end("jester")
+        else:
+            self._check_win_conditions(now)
+
+    # ------------------------------
+    # Transitions
+    # ------------------------------
+    @transition
+    def connect(self, rfid, color):
+        if rfid not in self.players:
+            self._emit("connect", rfid=rfid, color=color)
+        return {"status": "connected", "rfid": rfid, "color": color}
+
+    @transition
+    def start(self):
+        if self.required_players is not None and len(self.players) > self.required_players:
+            return {"error": f"At most {self.required_players} players can play."}
+        self._emit("start")
+        self.scheduler.schedule("game_timeout", self.game_duration, self.timeout)
+        return {"status": "game started"}
+
+    @transition
+    def reset(self):
+        self.scheduler.cancel_all()
+        self._emit("reset", roles=self._assign_roles(), **self._scaled_thresholds())
+        return {"status": "game reset"}
+
+    @transition
+    def kill(self, impostor, target):
+        players = self.players
+        if self.game_state != "running":
+            return {"error": "Game not running"}
+        if impostor not in players or target not in players:
+            return {"error": "Invalid player RFID"}
+        if players[impostor].role != "impostor":
+            return {"error": "Not an impostor"}
+        if not players[impostor].alive:
+            return {"error": "Dead impostors cannot kill"}
+        if players[target].role == "impostor":
+            return {"error": "Cannot kill a fellow impostor"}
+        if not players[target].alive:
+            return {"error": "Target already dead"}
+
+        now = self.clock.now()
+        if now < players[impostor].kill_ready:
+            return {"error": f"Kill cooldown active. {(players[impostor].kill_ready - now) // NS}s remaining."}
+
+        meeting_was_pending = self.meeting_pending
+        self._emit("kill", now, impostor=impostor, target=target)
+        if not meeting_was_pending:
+            self.scheduler.schedule("meeting_start", self.meeting_delay, self.start_meeting)
+        return {
+            "status": f"{players[target].color} was killed.",
+            "death_type": "killed",
+            "winner": self.game_winner if self.game_state == "ended" else None
+        }
+
+    @transition
+    def eject(self, rfid):
+        if self.game_state != "running":
+            return {"error": "Game not running."}
+        if rfid not in self.players:
+            return {"error": "Player not found."}
+        if not self.players[rfid].alive:
+            return {"error": "Player is already dead."}
+
+        self._emit("eject", rfid=rfid)
+        return {
+            "status": f"{self.players[rfid].color} has been ejected",
+            "winner": self.game_winner if self.game_state == "ended" else None,
+            "death_type": "ejected"
+        }
+
+    @transition
+    def complete_task(self):
+        if self.game_state != "running":
+            return {"error": "Game not running"}
+        if self.total_tasks_done < self.task_goal:
+            self._emit("task")
+        return {"status": f"Task completed. Total: {self.total_tasks_done}"}
+
+    @transition
+    def set_eject(self, rfid):
+        if not self.meeting_active:
+            return {"error": "Meeting not active, cannot set eject."}
+        if rfid == "":
+            self._emit("set_eject", rfid=None)
+            return {"status": "Eject selection cleared"}
+        if rfid not in self.players or not self.players[rfid].alive:
+            return {"error": "Invalid or dead player"}
+        self._emit("set_eject", rfid=rfid)
+        return {"status": f"{self.players[rfid].color} selected for eject after meeting"}
+
+    @transition
+    def vote(self, voter, target):
+        """One player's vote in the current meeting; voting again replaces it. `target` may be SKIP."""
+        if not self.meeting_active:
+            return {"error": "No meeting in progress."}
+        if voter not in self.players or not self.players[voter].alive:
+            return {"error": "Only alive players can vote."}
+        if target != SKIP and (target not in self.players or not self.players[target].alive):
+            return {"error": "Invalid or dead player"}
+        if self.votes.get(voter) != target:
+            self._emit("vote", voter=voter, target=target)
+        return {"status": "Vote to skip recorded" if target == SKIP
+                else f"Vote for {self.players[target].color} recorded", "votes": self.tally[target]}
+
+    @transition
+    def process_eject(self):
+        rfid = self.pending_eject_rfid
+        if not rfid:
+            return {"status": "No eject selected"}
+        self._emit("process_eject")
+        return {"status": f"{self.players[rfid].color} ejected after meeting"}
+
+    # ------------------------------
+    # Scheduled transitions
+    # ------------------------------
+    # Each one first checks it is still due: a timer armed by another worker, or
+    # before a reset, may fire after the state has moved on.
+    @transition
+    def start_meeting(self):
+        if not self.meeting_pending or self.clock.now() < self.meeting_due - TIMER_SLACK:
+            return
+        self._emit("meeting_start")
+        if self.meeting_active:
+            self.scheduler.schedule("meeting_end", self.meeting_duration, self.end_meeting)
+
+    @transition
+    def end_meeting(self):
+        if not self.meeting_active or self.clock.now() < self.meeting_ends - TIMER_SLACK:
+            return
+        self._emit("meeting_end", ejected=self._meeting_result())
+
+    @transition
+    def timeout(self):
+        if self.game_state != "running" or self.clock.now() < self.game_ends - TIMER_SLACK:
+            return
+        self._emit("timeout")
+
+    # ------------------------------
+    # Persistence
+    # ------------------------------
+    def to_state(self):
+        """The whole game state as plain JSON data, for log snapshots."""
+        with self.lock:
+            players = [[p.rfid, p.color, p.role, p.alive, p.kill_ready, p.death_type,
+                        p.death_time, self.players.kills[p.rfid]] for p in self.players.values()]
+            return self.version, {
+                "players": players,
+                "game_state": self.game_state,
+                "game_start_time": self.game_start_time,
+                "game_ends": self.game_ends,
+                "game_winner": self.game_winner,
+                "win_announced": self.win_announced,
+                "impostor_kill_count": self.impostor_kill_count,
+                "meeting_active": self.meeting_active,
+                "meeting_start_time": self.meeting_start_time,
+                "meeting_ends": self.meeting_ends,
+                "meeting_pending": self.meeting_pending,
+                "meeting_due": self.meeting_due,
+                "pre_meeting_alert": self.pre_meeting_alert,
+                "pending_eject_rfid": self.pending_eject_rfid,
+                "votes": self.votes,
+                "total_tasks_done": self.total_tasks_done,
+                "task_goal": self.task_goal,
+                "impostor_win_kills": self.impostor_win_kills,
+            }
+
+    def _load_state(self, version, state):
+        self.players.load([(rfid, color, role, alive, self._kill_ready(kill_ready), death_type,
+                            parse_time(death_time), kills)
+                           for rfid, color, role, alive, kill_ready, death_type, death_time, kills in state["players"]])
+        self.game_state = state["game_state"]
+        self.game_start_time = parse_time(state["game_start_time"])
+        # Snapshots from before the deadlines were stored only have the start times
+        self.game_ends = state.get("game_ends", self._after(self.game_start_time, self.game_duration))
+        self.game_winner = state["game_winner"]
+        self.win_announced = state["win_announced"]
+        self.impostor_kill_count = state["impostor_kill_count"]
+        self.meeting_active = state["meeting_active"]
+        self.meeting_start_time = parse_time(state["meeting_start_time"])
+        self.meeting_ends = state.get("meeting_ends", self._after(self.meeting_start_time, self.meeting_duration))
+        self.meeting_pending = state["meeting_pending"]
+        self.meeting_due = parse_time(state["meeting_due"])
+        self.pre_meeting_alert = state["pre_meeting_alert"]
+        self.pending_eject_rfid = state["pending_eject_rfid"]
+        self.votes = dict(state.get("votes", {}))
+        self.tally = Counter(self.votes.values())
+        self.total_tasks_done = state["total_tasks_done"]
+        self.task_goal = state.get("task_goal", self.task_goal)
+        self.impostor_win_kills = state.get("impostor_win_kills", self.impostor_win_kills)
+        self.version = version
+        self._build_role_reveal()
+
+    def _kill_ready(self, value):
+        """A snapshot's kill_ready; older snapshots hold the last kill's ISO time instead."""
+        if isinstance(value, str):
+            last_kill = parse_time(value)
+            return 0 if last_kill is None else last_kill + self.kill_cooldown
+        return value
+
+    @staticmethod
+    def _after(start, duration):
+        return None if start is None else start + seconds(duration)
+
+    def recover(self):
+        """Rebuilds the state from the log's snapshot and events, then re-arms the timers."""
+        if self.log is None:
+            return
+        snapshot, events = self.log.load()
+        with self.lock:
+            if snapshot is not None:
+                self._load_state(snapshot["seq"], snapshot["state"])
+            for event in events:
+                self._apply(event)
+                self.version = event["seq"]
+            self._resume_timers()
+
+    def _resume_timers(self):
+        now = self.clock.now()
+        if self.game_state == "running":
+            self.scheduler.schedule("game_timeout", max(0, self.game_ends - now) / NS, self.timeout)
+        if self.meeting_pending and self.meeting_due is not None:
+            self.scheduler.schedule("meeting_start", max(0, self.meeting_due - now) / NS, self.start_meeting)
+        if self.meeting_active:
+            self.scheduler.schedule("meeting_end", max(0, self.meeting_ends - now) / NS, self.end_meeting)
+
+    # ------------------------------
+    # Reads
+    # ------------------------------
+    def role_text(self, rfid):
+        """The two 16-character LCD lines for a card: color, then role. A plain dict lookup, no lock
+        (after catching up with a shared log)."""
+        self.sync()
+        return self.role_reveal.get(rfid, UNKNOWN_CARD)
+
+    def check_invariants(self):
+        """Returns a list of broken invariants (empty when the state is consistent)."""
+        with self.lock:
+            errors = []
+            players = self.players
+            killed = sum(1 for p in players.values() if not p.alive and p.death_type == "killed")
+            if killed != self.impostor_kill_count:
+                errors.append(f"{killed} killed players but impostor_kill_count={self.impostor_kill_count}")
+            if self.total_tasks_done > self.task_goal:
+                errors.append(f"tasks {self.total_tasks_done} exceed goal {self.task_goal}")
+            for rfid, p in players.items():
+                if p.alive and p.death_type:
+                    errors.append(f"{rfid} is alive with death_type={p.death_type}")
+
+            # Counters must match a full recount
+            alive = Counter(p.role for p in players.values() if p.alive)
+            dead = Counter(p.death_type for p in players.values() if not p.alive)
+            if +players.alive != alive:
+                errors.append(f"alive counters {dict(+players.alive)} != recount {dict(alive)}")
+            if +players.dead != dead:
+                errors.append(f"dead counters {dict(+players.dead)} != recount {dict(dead)}")
+            if sum(players.kills.values()) != self.impostor_kill_count:
+                errors.append(f"per-impostor kills {dict(players.kills)} don't add up to {self.impostor_kill_count}")
+            if +self.tally != Counter(self.votes.values()):
+                errors.append(f"vote tally {dict(+self.tally)} != recount of {len(self.votes)} votes")
+            return errors
+
+    # ------------------------------
+    # Status snapshot
+    # ------------------------------
+    def _record_changes(self, old, new):
+        """Appends the players/fields that differ between two snapshots to the change log."""
+        # Unchanged players reuse their cached dict, so identity is enough
+        changed_rfids = {rfid for rfid, p in new["players"].items() if old["players"].get(rfid) is not p}
+        changed_fields = {f for f in new if f not in ("players", "version") and old.get(f) != new[f]}
+        self.status_changes.append((old["version"], new["version"], changed_rfids, changed_fields))
+
+    def status_snapshot(self):
+        """Returns (version, etag, body) for the current status, serializing only when it changed.
+
+        Clocks are published as absolute server times (ms since the epoch, see
+        /clock) that clients count down to locally, so the body only changes
+        when the version does.
+        """
+        self.sync()
+        with self.lock:
+            version = self.version
+            cached_version, etag, body, previous = self.status_cache
+            if cached_version == version:
+                return version, etag, body
+
+            running = self.game_state == "running"
+            meeting_starts_at = self.meeting_start_time if self.meeting_active else self.meeting_due
+            snapshot = {
+                "version": version,
+                "game_state": self.game_state,
+                "players": self.players.to_json(),
+                "tasks_done": self.total_tasks_done,
+                "task_goal": self.task_goal,
+                "winner": self.game_winner if self.game_state == "ended" else None,
+                "game_ends_at": epoch_ms(self.game_ends) if running else None,
+                "meeting_active": self.meeting_active,
+                "meeting_starts_at": epoch_ms(meeting_starts_at) if running else None,
+                "meeting_ends_at": epoch_ms(self.meeting_ends) if self.meeting_active else None,
+                "pre_meeting_alert": self.pre_meeting_alert,
+                "pre_meeting_alert_at": epoch_ms(self.meeting_due - seconds(self.meeting_delay))
+                if self.pre_meeting_alert and self.meeting_due is not None else None,
+                "votes": {target: n for target, n in self.tally.items() if n},
+                "votes_cast": len(self.votes),
+                "eject_selected": self.pending_eject_rfid,
+            }
+
+        started = time.perf_counter()
+        body = json.dumps(snapshot)
+        STATUS_SERIALIZE.observe(time.perf_counter() - started)
+        etag = f'"{self.etag_prefix}:{version}"'
+        with self.cache_lock:
+            previous = self.status_cache[3]
+            if previous is not None and previous["version"] > version:
+                return version, etag, body  # a newer snapshot won the race; don't roll the cache back
+            if previous is not None and previous["version"] != version:
+                self._record_changes(previous, snapshot)
+            self.status_cache = (version, etag, body, snapshot)
+            self.delta_cache.clear()
+        return version, etag, body
+
+    def status_delta(self, since):
+        """Returns (version, etag, body) with only what changed after version `since`.
+
+        Falls back to the full snapshot when `since` is older than the change log.
+        """
+        self.status_snapshot()
+        with self.cache_lock:
+            key, etag, body, snapshot = self.status_cache
+            cached = self.delta_cache.get((key, since))
+            if cached:
+                return cached
+            changes = list(self.status_changes)
+
+        version = snapshot["version"]
+        if since > version:
+            return version, etag, body  # client saw a previous server run
+        changed_rfids, changed_fields = set(), set()
+        covered = since == version
+        for base, entry_version, rfids, fields in reversed(changes):
+            if entry_version <= since:
+                break
+            changed_rfids |= rfids
+            changed_fields |= fields
+            if base <= since:
+                covered = True
+                break
+        if not covered:
+            return version, etag, body
+
+        delta = {"version": version, "since": since, "delta": True,
+                 "players": {rfid: snapshot["players"][rfid] for rfid in changed_rfids}}
+        for field in changed_fields:
+            delta[field] = snapshot[field]
+        result = (version, etag[:-1] + f'+{since}"', json.dumps(delta))
+        with self.cache_lock:
+            if self.status_cache[0] == key and len(self.delta_cache) < 64:
+                self.delta_cache[(key, since)] = result
+        return result
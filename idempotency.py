@@ -0,0 +1,73 @@
+# File: idempotency.py
+import threading
+import time
+from collections import OrderedDict
+
+
+IDEMPOTENCY_TTL = 300       # seconds a reply is kept for replays; far longer than any reader's retry loop
+IDEMPOTENCY_MAX_KEYS = 1024  # per lobby; oldest replies are dropped first
+
+_FAILED = object()
+
+
+class KeyReused(Exception):
+    """The same idempotency key was sent with a different request."""
+
+
+class IdempotencyCache:
+    """Bounded TTL cache of transition results keyed by client-chosen request ids.
+
+    A retry carrying the same key gets the original reply without re-running
+    the transition. A retry that arrives while the first attempt is still
+    running waits for it instead of running the transition a second time.
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, max_keys=IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.entries = OrderedDict()  # key -> [request, expires, result, done Event]
+        self.lock = threading.Lock()
+
+    def run(self, key, request, transition, *args):
+        """Returns (result, replayed). `request` identifies what the key was first used for."""
+        with self.lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = [request, now + self.ttl, None, threading.Event()]
+                owner = True
+            elif entry[0] != request:
+                raise KeyReused(key)
+            else:
+                owner = False
+
+        if not owner:
+            entry[3].wait()
+            if entry[2] is _FAILED:
+                return self.run(key, request, transition, *args)
+            return entry[2], True
+
+        try:
+            entry[2] = transition(*args)
+        except BaseException:
+            entry[2] = _FAILED
+            with self.lock:
+                self.entries.pop(key, None)  # nothing happened; let the retry run it
+            entry[3].set()
+            raise
+        entry[3].set()
+        return entry[2], False
+
+    def _expire(self, now):
+        entries = self.entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if entry[1] > now and len(entries) < self.max_keys:
+                break
+            if not entry[3].is_set():
+                break  # still running; never evict an in-flight key
+            del entries[key]
+
+    def __len__(self):
+        return len(self.entries)
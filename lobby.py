@@ -0,0 +1,210 @@
+# File: lobby.py
+import asyncio
+import os
+import re
+import secrets
+import threading
+import time
+
+from analytics import RoundRecorder, open_analytics
+from backend import BACKEND, SYNC_INTERVAL, MemoryBackend, open_backend
+from config import game_settings
+from game import GameState
+
+
+DEFAULT_LOBBY = "main"     # served by the un-prefixed routes; never evicted
+LOBBY_IDLE_TIMEOUT = 1800  # seconds without requests or open streams before a lobby is evicted
+DATA_DIR = os.environ.get("GAME_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+POLLER_WINDOW = 10         # seconds; a client that polled /status this recently counts as connected
+
+LOBBY_ID = re.compile(r"^[A-Za-z0-9_-]{1,32}$")  # also used as the event log file name
+
+
+def valid_lobby_id(lobby_id):
+    return bool(LOBBY_ID.match(lobby_id))
+
+
+class Lobby:
+    """One isolated game plus the /status/stream connections watching it."""
+
+    def __init__(self, lobby_id, backend=None, analytics=None, settings=None):
+        self.id = lobby_id
+        self.loop = None
+        self.game = GameState(on_change=self.notify, lobby_id=lobby_id)
+        self.game.configure(**(settings or {}))
+        backend = backend or MemoryBackend()
+        self.game.log = backend.open_log(lobby_id, self.game.to_state)
+        if analytics is not None:
+            self.game.analytics = RoundRecorder(analytics)
+        self.replies = backend.replies(self.game)  # request id -> reply, for retried transitions
+        self.subscribers = set()  # one wake-up queue per open stream
+        self.last_broadcast_version = None
+        self.last_active = time.monotonic()
+        self.last_status = None  # monotonic time of the last /status request
+        self.pollers = {}        # client address -> monotonic time of its last /status request
+        self.closed = False
+
+    def start(self, loop):
+        """Starts the lobby's timers, first replaying its event log if it has one."""
+        self.loop = loop
+        self.game.scheduler.start(loop)
+        self.game.recover()
+
+    def close(self, delete_log=False):
+        """Stops the lobby's timers and ends its open streams. Runs on the event loop."""
+        self.closed = True
+        self.game.scheduler.stop()
+        self._wake_all()
+        if self.game.log is not None:
+            if delete_log:
+                self.game.log.delete()
+            else:
+                self.game.log.close()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def status_polled(self, client):
+        self.last_status = self.pollers[client] = time.monotonic()
+
+    def recent_pollers(self, now):
+        """Clients that polled /status within POLLER_WINDOW; forgets the others."""
+        for client, seen in list(self.pollers.items()):
+            if now - seen > POLLER_WINDOW:
+                self.pollers.pop(client, None)
+        return len(self.pollers)
+
+    def idle_for(self, now):
+        return 0 if self.subscribers else now - self.last_active
+
+    def notify(self):
+        """Pushes fresh status to this lobby's streams. Safe to call from any thread."""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.broadcast)
+
+    def broadcast(self):
+        """Wakes every open stream, once per status version. Runs on the event loop, so it only
+        reads the version; the streams serialize the status in a thread."""
+        if not self.subscribers or self.game.version == self.last_broadcast_version:
+            return
+        self.last_broadcast_version = self.game.version
+        self._wake_all()
+
+    def _wake_all(self):
+        for queue in self.subscribers:
+            if not queue.full():
+                queue.put_nowait(None)
+
+
+class LobbyRegistry:
+    """All lobbies hosted by this process, created and evicted at runtime.
+
+    With a shared backend, every worker's registry holds a copy of every
+    lobby; sync() picks up the ones other workers created or removed.
+    """
+
+    def __init__(self, idle_timeout=LOBBY_IDLE_TIMEOUT, data_dir=DATA_DIR, backend=BACKEND, settings=None):
+        self.idle_timeout = idle_timeout
+        self.data_dir = data_dir
+        self.backend = open_backend(backend, data_dir)
+        self.settings = game_settings() if settings is None else settings  # GameState parameters
+        self.lock = threading.Lock()
+        self.loop = None
+        # Finished rounds of every lobby, for /analytics
+        self.analytics = open_analytics(os.path.join(data_dir, "analytics")) if data_dir else None
+        self.backend.claim(DEFAULT_LOBBY)
+        self.lobbies = {DEFAULT_LOBBY: self._new_lobby(DEFAULT_LOBBY)}
+
+    def _new_lobby(self, lobby_id):
+        return Lobby(lobby_id, self.backend, self.analytics, self.settings)
+
+    def start(self, loop):
+        """Starts every lobby, recovering the ones the backend has state for."""
+        self.loop = loop
+        for lobby_id in self.backend.lobby_ids():
+            if valid_lobby_id(lobby_id) and lobby_id not in self.lobbies:
+                self.lobbies[lobby_id] = self._new_lobby(lobby_id)
+        for lobby in self.lobbies.values():
+            lobby.start(loop)
+
+    def stop(self):
+        for lobby in self.lobbies.values():
+            lobby.close()
+        if self.analytics is not None:
+            self.analytics.flush()
+        self.loop = None
+
+    def ready(self):
+        """True once every lobby is recovered and its timers armed, while the backend answers."""
+        return self.loop is not None and self.backend.check()
+
+    def get(self, lobby_id):
+        return self.lobbies.get(lobby_id)
+
+    def create(self, lobby_id=None):
+        """Creates a lobby (random id if none given); returns None if the id is taken."""
+        with self.lock:
+            lobby_id = lobby_id or secrets.token_hex(4)
+            if lobby_id in self.lobbies or not self.backend.claim(lobby_id):
+                return None
+            lobby = self.lobbies[lobby_id] = self._new_lobby(lobby_id)
+        if self.loop is not None:
+            lobby.start(self.loop)
+        return lobby
+
+    def remove(self, lobby_id):
+        """Destroys a lobby. The default lobby can't be removed."""
+        if lobby_id == DEFAULT_LOBBY:
+            return False
+        with self.lock:
+            lobby = self.lobbies.pop(lobby_id, None)
+            if lobby is not None and self.backend.shared:
+                lobby.game.log.delete()  # now, so sync() can't adopt it back in the meantime
+        if lobby is None:
+            return False
+        if self.loop is not None:
+            # A shared log is already gone; close() runs on the loop and mustn't touch the database
+            self.loop.call_soon_threadsafe(lobby.close, not self.backend.shared)
+        elif lobby.game.log is not None:
+            lobby.game.log.delete()
+        return True
+
+    def evict_idle(self):
+        """Removes lobbies idle for longer than idle_timeout (in every worker); returns their ids."""
+        now, wall = time.monotonic(), time.time()
+        lobbies = list(self.lobbies.items())
+        self.backend.touch({lobby_id: wall - lobby.idle_for(now) for lobby_id, lobby in lobbies})
+        idle = [lobby_id for lobby_id, lobby in lobbies
+                if lobby_id != DEFAULT_LOBBY and lobby.idle_for(now) > self.idle_timeout
+                and self.backend.idle_since(lobby_id, wall - self.idle_timeout)]
+        for lobby_id in idle:
+            self.remove(lobby_id)
+        return idle
+
+    async def evict_forever(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.evict_idle)
+
+    def sync(self):
+        """Shared backend: adopts lobbies other workers created, drops the ones they
+        removed, and applies their new events (which wakes this worker's streams)."""
+        heads = self.backend.heads()
+        with self.lock:
+            added = [self.lobbies.setdefault(lobby_id, self._new_lobby(lobby_id))
+                     for lobby_id in heads.keys() - self.lobbies.keys() if valid_lobby_id(lobby_id)]
+            removed = [self.lobbies.pop(lobby_id) for lobby_id in self.lobbies.keys() - heads.keys()
+                       if lobby_id != DEFAULT_LOBBY]
+        for lobby in added:
+            lobby.start(self.loop)
+        for lobby in removed:
+            self.loop.call_soon_threadsafe(lobby.close)
+        for lobby_id, lobby in list(self.lobbies.items()):
+            if heads.get(lobby_id, 0) > lobby.game.version:
+                lobby.game.sync()
+
+    async def sync_forever(self, interval=SYNC_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.sync)
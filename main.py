@@ -1,889 +1,337 @@
 # File: main.py
-from fastapi import FastAPI, Form
-from fastapi.responses import HTMLResponse
-from datetime import datetime, timedelta
-import uvicorn
-import random
-from threading import Timer
+if __name__ == "__main__":
+    # `python main.py [profile]`: the launcher settles the settings and their environment before
+    # anything below is imported, then serves this file imported as `main`, so the app is built once
+    from config import launch
+    raise SystemExit(launch())
+
+from fastapi import APIRouter, Depends, FastAPI, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+import asyncio
 import os
+import time
+
+from analytics import GROUP_COLUMNS
+from assets import AssetStore, json_response
+from backend import BackendBusy
+from clock import system_clock
+from config import launched_profile
+from idempotency import KeyReused
+from lobby import DEFAULT_LOBBY, Lobby, LobbyRegistry, valid_lobby_id
+from metrics import Gauge, MetricsMiddleware, render_metrics
+from reader import FrameError, handle_frame
+
+
+@asynccontextmanager
+async def lifespan(app):
+    lobbies.start(asyncio.get_running_loop())
+    tasks = [asyncio.create_task(lobbies.evict_forever())]
+    if lobbies.backend.shared:
+        tasks.append(asyncio.create_task(lobbies.sync_forever()))
+    yield
+    for task in tasks:
+        task.cancel()
+    lobbies.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+# Game and database calls run in threads (plain def handlers, or asyncio.to_thread in the
+# async ones): with the sqlite backend they may wait up to BUSY_TIMEOUT for another
+# worker's write lock, and the event loop must keep serving the streams meanwhile.
+@app.exception_handler(BackendBusy)
+async def backend_busy(request: Request, exc: BackendBusy):
+    return JSONResponse({"detail": "Game state is busy, try again"}, status_code=503,
+                        headers={"Retry-After": "1"})
 
 
-app = FastAPI()
-win_announced = False
-#from fastapi.staticfiles import StaticFiles
-#static_path = os.path.join(os.path.dirname(__file__), "static")
-
-#app.mount("/static", StaticFiles(directory=static_path), name="static")
+# ------------------------------
+# Lobbies
+# ------------------------------
+# Every game route below is served twice: at the root for the default lobby,
+# and under /lobby/{lobby_id}/ for the other lobbies.
+lobbies = LobbyRegistry()
+router = APIRouter()
+
+def current_lobby(request: Request):
+    lobby = lobbies.get(request.path_params.get("lobby_id", DEFAULT_LOBBY))
+    if lobby is None:
+        raise HTTPException(status_code=404, detail="Lobby not found")
+    lobby.touch()
+    return lobby
+
+def idempotent(request: Request, response: Response, lobby: Lobby = Depends(current_lobby)):
+    """Runs a transition at most once per Idempotency-Key header (or ?request_id=).
+
+    Retries with the same key get the first reply back, marked with an
+    Idempotent-Replayed header.
+    """
+    key = request.headers.get("idempotency-key") or request.query_params.get("request_id")
+
+    def run(transition, *args):
+        if not key:
+            return transition(*args)
+        try:
+            result, replayed = lobby.replies.run(key, (transition.__name__, args), transition, *args)
+        except KeyReused:
+            raise HTTPException(status_code=422, detail="Idempotency key already used for a different request")
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        return result
+    return run
+
+@app.get("/lobbies")
+def list_lobbies():
+    return {lobby_id: {"game_state": lobby.game.game_state, "players": len(lobby.game.players)}
+            for lobby_id, lobby in list(lobbies.lobbies.items())}
+
+@app.post("/lobby")
+def create_lobby(lobby_id: str = Form(None)):
+    if lobby_id is not None and not valid_lobby_id(lobby_id):
+        return {"error": "Lobby id must be 1-32 letters, digits, '-' or '_'."}
+    lobby = lobbies.create(lobby_id)
+    if lobby is None:
+        return {"error": "Lobby already exists."}
+    return {"status": "created", "lobby": lobby.id}
+
+@app.delete("/lobby/{lobby_id}")
+def delete_lobby(lobby_id: str):
+    if not lobbies.remove(lobby_id):
+        return {"error": "Lobby not found or cannot be removed."}
+    return {"status": "removed", "lobby": lobby_id}
 
 
 # ------------------------------
-# Game State
+# Analytics (finished rounds of every lobby)
 # ------------------------------
-players = {}  # {rfid: {"color": str, "role": str, "alive": bool, "last_kill": datetime}}
-colors = ["Red", "Blue", "Green", "Yellow", "Orange", "Pink", "Purple", "Cyan", "White", "Lime"]
-
-game_state = "waiting"  # waiting / running / ended
-game_start_time = None
-game_winner = None  # None / "crewmates" / "impostors" / "jester" / "draw"
+@app.get("/analytics")
+def analytics(group_by: str = None):
+    """Win rate by faction, time to first kill and tasks per minute, optionally grouped by a game parameter."""
+    if lobbies.analytics is None:
+        return {"error": "Analytics are not being recorded."}
+    if group_by is not None and group_by not in GROUP_COLUMNS:
+        return {"error": f"group_by must be one of: {', '.join(GROUP_COLUMNS)}"}
+    return lobbies.analytics.aggregate(group_by)
+
+@app.get("/analytics/rounds/{round_id}")
+def analytics_round(round_id: int):
+    round_info = lobbies.analytics.timeline(round_id) if lobbies.analytics is not None else None
+    if round_info is None:
+        raise HTTPException(status_code=404, detail="Round not found")
+    return round_info
 
-# New Game Parameters
-game_duration = 600  # 5 minutes
-task_goal = 6
-required_players = 10
-kill_cooldown = timedelta(seconds=75)  # 1.5 minutes
-impostor_kill_count = 0
 
 # ------------------------------
-# Meeting State
+# Metrics
 # ------------------------------
-meeting_active = False
-meeting_start_time = None
-meeting_duration = 50  # seconds
-meeting_delay = 6      # seconds after death
+def _per_lobby(value):
+    now = time.monotonic()
+    return [((lobby_id,), value(lobby, now)) for lobby_id, lobby in list(lobbies.lobbies.items())]
+
+Gauge("amongus_status_stream_clients", "Open /status/stream connections.", ("lobby",),
+      lambda: _per_lobby(lambda lobby, now: len(lobby.subscribers)))
+Gauge("amongus_status_pollers", "Clients that polled /status in the last 10 seconds.", ("lobby",),
+      lambda: _per_lobby(Lobby.recent_pollers))
+Gauge("amongus_seconds_since_last_status", "Seconds since the last /status request (-1 if none yet).", ("lobby",),
+      lambda: _per_lobby(lambda lobby, now: round(now - lobby.last_status, 3) if lobby.last_status else -1))
+
+@app.get("/metrics")
+def metrics_page():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
-# Tasks
-total_tasks_done = 0
 
 # ------------------------------
-# Helpers
+# API Endpoints
 # ------------------------------
-def assign_roles():
-    """Assigns roles: 2 Impostors, 1 Jester, 6 Crewmates."""
-    global players
-    rfids = list(players.keys())
-    random.shuffle(rfids)
-    for rfid in rfids[:2]:
-        players[rfid]["role"] = "impostor"
-    players[rfids[2]]["role"] = "jester"
-    for rfid in rfids[3:]:
-        players[rfid]["role"] = "crewmate"
-    for rfid in rfids:
-        players[rfid]["alive"] = True
-        players[rfid]["last_kill"] = datetime.min
-
-def reset_game():
-    """Resets the game to its initial waiting state."""
-    global players, game_state, total_tasks_done, game_start_time, game_winner, meeting_active, meeting_start_time, impostor_kill_count
-    for rfid in players:
-        players[rfid]["role"] = None
-        players[rfid]["alive"] = True
-        players[rfid]["last_kill"] = datetime.min
-    game_state = "waiting"
-    total_tasks_done = 0
-    game_start_time = None
-    game_winner = None
-    meeting_active = False
-    meeting_start_time = None
-    impostor_kill_count = 0
-
-def check_win_conditions():
-    global game_state, game_winner, win_announced, impostor_kill_count
-    if game_state != "running":
-        return
 
-    # If jester already won, skip checks
-    if game_winner == "jester":
-        return
+@router.post("/eject/{rfid}")
+def eject(rfid: str, lobby: Lobby = Depends(current_lobby), run=Depends(idempotent)):
+    return run(lobby.game.eject, rfid)
+
 
-    alive_crewmates = sum(1 for p in players.values() if p["alive"] and p["role"] in ["crewmate", "jester"])
-    alive_impostors = sum(1 for p in players.values() if p["alive"] and p["role"] == "impostor")
+@router.get("/connect/{rfid}/{color}")
+def connect_player(rfid: str, color: str, lobby: Lobby = Depends(current_lobby), run=Depends(idempotent)):
+    return run(lobby.game.connect, rfid, color)
 
-    if total_tasks_done >= task_goal or alive_impostors == 0:
-        game_state = "ended"
-        game_winner = "crewmates"
-    #elif alive_crewmates <= 2:
-    elif impostor_kill_count >= 5:
-        game_state = "ended"
-        game_winner = "impostors"
-    elif game_start_time:
-        elapsed = (datetime.now() - game_start_time).total_seconds()
-        if elapsed >= game_duration:
-            game_state = "ended"
-            game_winner = "draw"
+@router.post("/start")
+def start_game(lobby: Lobby = Depends(current_lobby), run=Depends(idempotent)):
+    return run(lobby.game.start)
 
-    if game_state == "ended" and game_winner and not win_announced:
-        win_announced = True
+@router.post("/reset")
+def reset(lobby: Lobby = Depends(current_lobby), run=Depends(idempotent)):
+    return run(lobby.game.reset)
 
+@app.get("/clock")
+async def clock():
+    """Game time in ms since the epoch, for clients syncing their clocks (NTP-style, over a few round trips)."""
+    return Response(f'{{"now":{system_clock.now() / 1_000_000:.1f}}}', media_type="application/json",
+                    headers={"Cache-Control": "no-store"})
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once every lobby is recovered and the backend answers, 503 before that and while stopping."""
+    if not await asyncio.to_thread(lobbies.ready):
+        return Response('{"ready":false}', status_code=503, media_type="application/json",
+                        headers={"Cache-Control": "no-store"})
+    return {"ready": True, "lobbies": len(lobbies.lobbies), "profile": launched_profile(), "worker": os.getpid()}
 
+@router.get("/status")
+def status(request: Request, since: int = None, lobby: Lobby = Depends(current_lobby)):
+    game = lobby.game
+    lobby.status_polled(request.client.host if request.client else "")
+    _, etag, body = game.status_snapshot() if since is None else game.status_delta(since)
+    return json_response(request, etag, body, lobby.id)
 
 # ------------------------------
-# API Endpoints
+# Status Stream (Server-Sent Events)
 # ------------------------------
+@router.get("/status/stream")
+async def status_stream(request: Request, since: int = None, lobby: Lobby = Depends(current_lobby)):
+    """Full snapshot on connect, then deltas. Reconnects resume from Last-Event-ID,
+    or ?since= for clients that reopen the stream themselves."""
+    game = lobby.game
+    queue = asyncio.Queue(maxsize=1)
+    last_id = request.headers.get("last-event-id", "")
+    if last_id.isdigit():
+        since = int(last_id)
+
+    async def events():
+        nonlocal since
+        sent_etag = None
+        try:
+            # Registered once the stream runs, so a client gone before its first event can't leave it behind
+            lobby.subscribers.add(queue)
+            while not lobby.closed:
+                if since is None:
+                    version, etag, body = await asyncio.to_thread(game.status_snapshot)
+                else:
+                    version, etag, body = await asyncio.to_thread(game.status_delta, since)
+                if etag != sent_etag:
+                    yield f"id: {version}\ndata: {body}\n\n"
+                    sent_etag = etag
+                since = version
+                while True:
+                    try:
+                        await asyncio.wait_for(queue.get(), timeout=15)
+                        break
+                    except asyncio.TimeoutError:
+                        yield ": keep-alive\n\n"
+        finally:
+            lobby.subscribers.discard(queue)
+            lobby.touch()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@router.post("/kill/{impostor}/{target}")
+def kill(impostor: str, target: str, lobby: Lobby = Depends(current_lobby), run=Depends(idempotent)):
+    return run(lobby.game.kill, impostor, target)
+
+@router.post("/vote/{voter}/{target}")
+def vote(voter: str, target: str, lobby: Lobby = Depends(current_lobby), run=Depends(idempotent)):
+    """Votes during a meeting; target is a player RFID or "skip". Tallied as votes arrive,
+    resolved by the server when the meeting timer runs out."""
+    return run(lobby.game.vote, voter, target)
 
-@app.post("/eject/{rfid}")
-def eject(rfid: str):
-    global game_state, game_winner, win_announced
-    if game_state != "running":
-        return {"error": "Game not running."}
-    if rfid not in players:
-        return {"error": "Player not found."}
-    if not players[rfid]["alive"]:
-        return {"error": "Player is already dead."}
-
-    # Mark player dead
-    players[rfid]["alive"] = False
-    players[rfid]["death_type"] = "ejected"
-
-    # If jester is ejected → jester wins immediately
-    if players[rfid]["role"] == "jester":
-        game_state = "ended"
-        game_winner = "jester"
-        win_announced = True
-    else:
-        check_win_conditions()  # for normal ejections
-
-    return {
-        "status": f"{players[rfid]['color']} has been ejected",
-        "winner": game_winner if game_state=="ended" else None,
-        "death_type": "ejected"
-    }
-
-
-@app.get("/connect/{rfid}/{color}")
-async def connect_player(rfid: str, color: str):
-    if rfid not in players:
-        players[rfid] = {"color": color, "role": "Crewmate", "alive": True, "last_kill": datetime.min}
-    return {"status": "connected", "rfid": rfid, "color": color}
-
-@app.post("/start")
-def start_game():
-    global game_state, game_start_time
-    if len(players) > required_players :
-        return {"error": f"Need exactly {required_players} players to start."}
-    #reset_game()
-    #assign_roles()
-    game_state = "running"
-    game_start_time = datetime.now()
-    return {"status": "game started"}
-
-@app.post("/reset")
-def reset():
-    reset_game()
-    assign_roles()
-    return {"status": "game reset"}
-
-from fastapi.encoders import jsonable_encoder
-
-@app.get("/status")
-def status():
-    global meeting_active, meeting_start_time
-    check_win_conditions()
-
-    remaining_time = 0
-    if game_state == "running" and game_start_time:
-        elapsed = (datetime.now() - game_start_time).total_seconds()
-        remaining_time = max(0, game_duration - int(elapsed))
-
-    # Meeting countdown
-    meeting_remaining = 0
-    meeting_countdown_tick = None
-    if meeting_active and meeting_start_time:
-        elapsed = (datetime.now() - meeting_start_time).total_seconds()
-        meeting_remaining = max(0, meeting_duration - int(elapsed))
-
-        # 🔥 server-based countdown (10→1 every ~5s)
-        if meeting_remaining > 0:
-            tick = int((meeting_duration - meeting_remaining) // 5)  # every 5s
-            meeting_countdown_tick = max(10 - tick, 0)
-
-        if meeting_remaining == 0:
-            meeting_active = False
-            meeting_start_time = None
-
-    for p in players.values():
-        if not p["alive"]:
-            p["death_type"] = p.get("death_type", "killed")
-
-    return {
-        "game_state": game_state,
-        "time_remaining": remaining_time,
-        "players": jsonable_encoder(players),
-        "tasks_done": total_tasks_done,
-        "task_goal": task_goal,
-        "winner": game_winner if game_state == "ended" else None,
-        "meeting_remaining": meeting_remaining,
-        "meeting_countdown": meeting_countdown_tick,  # 👈 NEW
-        "pre_meeting_alert": pre_meeting_alert  # 🔹 frontend uses this
-    }
-
-from threading import Timer
-
-meeting_timer = None   # add this at the top with your globals
-meeting_delay = 6      # 5s delay before meeting starts
-pre_meeting_alert= False
-@app.post("/kill/{impostor}/{target}")
-def kill(impostor: str, target: str):
-    global meeting_active, meeting_start_time, meeting_timer, pre_meeting_alert
-    if game_state != "running":
-        return {"error": "Game not running"}
-    if impostor not in players or target not in players:
-        return {"error": "Invalid player RFID"}
-    if players[impostor]["role"] != "impostor":
-        return {"error": "Not an impostor"}
-    if not players[impostor]["alive"]:
-        return {"error": "Dead impostors cannot kill"}
-    if players[target]["role"] == "impostor":
-        return {"error": "Cannot kill a fellow impostor"}
-    if not players[target]["alive"]:
-        return {"error": "Target already dead"}
-
-    now = datetime.now()
-    if now - players[impostor]["last_kill"] < kill_cooldown:
-        cooldown_left = kill_cooldown - (now - players[impostor]["last_kill"])
-        return {"error": f"Kill cooldown active. {int(cooldown_left.total_seconds())}s remaining."}
-
-    # mark victim dead
-    players[target]["alive"] = False
-    players[target]["death_time"] = now
-    players[target]["death_type"] = "killed"
-
-    # update impostor kill info
-    players[impostor]["last_kill"] = now
-    global impostor_kill_count
-    impostor_kill_count += 1
-    pre_meeting_alert=True
-
-    # Schedule meeting only if no meeting is already pending
-    if meeting_timer is None:
-        def start_meeting():
-            global meeting_active, meeting_start_time, meeting_timer
-            if game_state == 'running':
-                pre_meeting_alert = False
-                meeting_active = True
-                meeting_start_time = datetime.now()
-            meeting_timer = None  # reset so future kills can trigger again
-
-        meeting_timer = Timer(meeting_delay, start_meeting)
-        meeting_timer.start()
-
-    check_win_conditions()
-    return {
-        "status": f"{players[target]['color']} was killed.",
-        "death_type": "killed",
-        "winner": game_winner if game_state == "ended" else None
-    }
-
-
-
-
-@app.get("/role/{rfid}")
-def get_role(rfid: str):
+# ------------------------------
+# Reader Protocol (binary, batched taps; see reader.py)
+# ------------------------------
+# Readers keep one connection open: HTTP keep-alive POSTs, or a WebSocket.
+@router.post("/reader")
+async def reader_taps(request: Request, lobby: Lobby = Depends(current_lobby)):
+    try:
+        ack = await asyncio.to_thread(handle_frame, lobby, await request.body())
+    except FrameError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(ack, media_type="application/octet-stream")
+
+@router.websocket("/reader/ws")
+async def reader_socket(websocket: WebSocket):
+    lobby = lobbies.get(websocket.path_params.get("lobby_id", DEFAULT_LOBBY))
+    if lobby is None:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    try:
+        while not lobby.closed:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            frame = message.get("bytes")
+            if frame is None:  # a text frame; taps only come as binary frames
+                await websocket.close(code=1003)
+                return
+            lobby.touch()
+            try:
+                ack = await asyncio.to_thread(handle_frame, lobby, frame)
+            except FrameError:
+                await websocket.close(code=1003)  # unsupported data, like the 400 over HTTP
+                return
+            except BackendBusy:
+                await websocket.close(code=1013)  # try again later; the reader resends unacked taps
+                return
+            await websocket.send_bytes(ack)
+        await websocket.close(code=1000)  # the lobby was removed
+    except WebSocketDisconnect:
+        pass  # the reader went away mid-batch; it resends unacked taps on reconnect
+
+
+@router.get("/role/{rfid}", response_class=PlainTextResponse)
+def get_role(rfid: str, lobby: Lobby = Depends(current_lobby)):
     """
-    Returns a simple text with the player's color and role.
-    Example: "Red: CREWMATE"
+    Returns the player's color and role as two fixed 16-character LCD lines, unquoted.
+    Example: "Red             CREWMATE        "
     """
-    if rfid not in players:
-        return "Unknown Card"
-    
-    player_info = players[rfid]
-    role = player_info.get("role", "Unknown").upper()
-    color = player_info.get("color", "Unknown")
-    
-    return f"{color}: {role}"
+    return PlainTextResponse(lobby.game.role_text(rfid))
 
 # ------------------------------
 # Logistics Task Completion Endpoint
 # ------------------------------
-@app.post("/logistics/complete_task")
-def complete_task():
-    global total_tasks_done
-    if game_state != "running":
-        return {"error": "Game not running"}
-    if total_tasks_done < task_goal:
-        total_tasks_done += 1
-    return {"status": f"Task completed. Total: {total_tasks_done}"}
-
-# To store pending eject during meeting
-pending_eject_rfid = None
-
-@app.post("/special-logistics/set_eject")
-def set_eject(rfid: str = Form(...)):
-    global pending_eject_rfid
-    if not meeting_active:
-        return {"error": "Meeting not active, cannot set eject."}
-    if rfid =="":
-        pending_eject_rfid=None
-        return {"status": "Eject selection cleared"}
-
-    if rfid not in players or not players[rfid]["alive"]:
-        return {"error": "Invalid or dead player"}
-    pending_eject_rfid = rfid
-    return {"status": f"{players[rfid]['color']} selected for eject after meeting"}
-
-@app.post("/special-logistics/process_eject")
-def process_eject():
-    global pending_eject_rfid
-    if pending_eject_rfid:
-        rfid = pending_eject_rfid
-        pending_eject_rfid = None
-        # Actually eject player
-        players[rfid]["alive"] = False
-        players[rfid]["death_type"] = "ejected"
-        # Check jester win
-        global game_state, game_winner, win_announced
-        if players[rfid]["role"] == "jester":
-            game_state = "ended"
-            game_winner = "jester"
-            win_announced = True
-        else:
-            check_win_conditions()
-        return {"status": f"{players[rfid]['color']} ejected after meeting"}
-    return {"status": "No eject selected"}
-
-
-@app.get("/special-logistics", response_class=HTMLResponse)
-def special_logistics_page():
-    return """
-<html>
-<head>
-<title>Special Logistics Panel</title>
-<style>
-body { font-family: Arial; text-align:center; margin-top:50px; background-color:#222; color:white; }
-button { font-size:1.5em; padding:10px 30px; margin:5px; cursor:pointer; border-radius:10px; }
-#alert { font-size:2em; color:red; display:none; margin-top:20px; }
-#tasks-status { font-size:1.5em; margin-top:20px; }
-.player-dead { display:block; margin:8px; padding:10px; border-radius:5px; font-size:1.2em; color:red; text-decoration: line-through; background:#444; }
-.player-btn { display:inline-block; margin:8px; padding:15px 30px; background:#333; color:white; border:none; }
-.selected { border: 3px solid yellow; }
-.section { margin-top:30px; }
-</style>
-</head>
-<body>
-<h1>Special Logistics Panel</h1>
-<p>Mark ONE task as done:</p>
-<button id="complete-task-btn">Complete Task</button>
-<p>Current Tasks Completed: <span id="tasks-status">-</span></p>
-
-<div class="section">
-<h2>Alive Players (Ejectable)</h2>
-<div id="alive-list"></div>
-</div>
-
-<div class="section">
-<h2>Dead Players</h2>
-<div id="dead-list"></div>
-</div>
-
-<div id="alert"></div>
-
-<script>
-let alertedDead = {};
-let pendingEject = null;
-
-function showAlert(msg){
-    const alertDiv = document.getElementById('alert');
-    alertDiv.innerText = msg;
-    alertDiv.style.display='block';
-    setTimeout(()=>{ alertDiv.style.display='none'; }, 10000);
-}
-
-// Blink background for deaths
-let flashIntervals = {};
-function blinkBackground(color){
-    const body = document.body;
-    let blink = true;
-    if(flashIntervals[color]) clearInterval(flashIntervals[color]);
-    flashIntervals[color] = setInterval(() => {
-        body.style.backgroundColor = blink ? color : "#222";
-        blink = !blink;
-    }, 500);
-    setTimeout(() => {
-        clearInterval(flashIntervals[color]);
-        body.style.backgroundColor = "#222";
-        delete flashIntervals[color];
-    }, 13000);
-}
-
-// Refresh status
-async function refreshStatus(){
-    let res = await fetch('/status');
-    let data = await res.json();
-
-    document.getElementById('tasks-status').innerText = data.tasks_done + " / " + data.task_goal;
-
-    // Handle deaths
-    for(let [rfid,p] of Object.entries(data.players)){
-        if(!p.alive && !alertedDead[rfid]){
-            alertedDead[rfid] = true;
-
-            if(p.death_type === "killed"){
-                showAlert(`${p.color} WAS KILLED!`);
-                blinkBackground(p.color); // blink only for kills
-            } else if(p.death_type === "ejected"){
-                showAlert(`${p.color} WAS EJECTED!`);
-            }
-        }
-    }
-
-    // Show alive players as eject buttons
-    let aliveHtml = '';
-    for(let [rfid,p] of Object.entries(data.players)){
-        if(p.alive){
-            let cls = (pendingEject===rfid) ? 'selected' : '';
-            aliveHtml += `<button class="player-btn ${cls}" onclick="selectEject('${rfid}')">${p.color}</button>`;
-        }
-    }
-    document.getElementById('alive-list').innerHTML = aliveHtml || "<p>No alive players</p>";
-
-    // Show dead players with cause
-    let deadHtml = '';
-    for(let [rfid,p] of Object.entries(data.players)){
-        if(!p.alive){
-            deadHtml += `<div class="player-dead">${p.color} - ${p.death_type.toUpperCase()}</div>`;
-        }
-    }
-    document.getElementById('dead-list').innerHTML = deadHtml || "<p>No deaths yet</p>";
-
-    // Auto eject after meeting ends
-    if(data.meeting_remaining===0 && pendingEject){
-        await fetch('/special-logistics/process_eject', {method:'POST'});
-        pendingEject = null;
-    }
-}
-
-// Select/unselect eject
-async function selectEject(rfid){
-    if(pendingEject === rfid){
-        pendingEject = null;
-        await fetch('/special-logistics/set_eject', {
-            method:'POST',
-            body: new URLSearchParams({'rfid': ''})  // clear selection
-        });
-    } else {
-        pendingEject = rfid;
-        await fetch('/special-logistics/set_eject', {
-            method:'POST',
-            body: new URLSearchParams({'rfid': rfid})
-        });
-    }
-    refreshStatus();
-}
-
-// Complete task button
-document.getElementById('complete-task-btn').addEventListener('click', async ()=>{
-    await fetch('/logistics/complete_task', {method:'POST'});
-    await refreshStatus();
-    showAlert("Task complete!");
-});
-
-setInterval(refreshStatus, 1000);
-window.onload = refreshStatus;
-</script>
-</body>
-</html>
-"""
+@router.post("/logistics/complete_task")
+def complete_task(lobby: Lobby = Depends(current_lobby), run=Depends(idempotent)):
+    return run(lobby.game.complete_task)
 
+@router.post("/special-logistics/set_eject")
+def set_eject(rfid: str = Form(...), lobby: Lobby = Depends(current_lobby), run=Depends(idempotent)):
+    return run(lobby.game.set_eject, rfid)
 
-
-# ------------------------------
-# Logistics Page
-# ------------------------------
-@app.get("/logistics", response_class=HTMLResponse)
-def logistics_page():
-    return """
-<html>
-<head>
-<title>Logistics Panel</title>
-<style>
-body { font-family: Arial; text-align:center; margin-top:50px; background-color:#222; color:white; }
-button { font-size:2em; padding:20px 40px; margin:5px; cursor:pointer; }
-#alert { font-size:2em; color:red; display:none; margin-top:20px; }
-#tasks-status { font-size:1.5em; margin-top:20px; }
-#players-list { margin-top:30px; font-size:1.5em; }
-.dead { color:red; text-decoration: line-through; }
-</style>
-</head>
-<body>
-<h1>Logistics Panel</h1>
-<button id="complete-task-btn">Mark ONE Task as Done</button>
-<p>Current Tasks Completed: <span id="tasks-status">-</span></p>
-<div id="alert"></div>
-
-<h2>Dead Players</h2>
-<div id="players-list"></div>
-
-<script>
-let alertedDead = {};
-let flashIntervals = {};
-
-function showAlert(msg){
-    const alertDiv = document.getElementById('alert');
-    alertDiv.innerText = msg;
-    alertDiv.style.display='block';
-    setTimeout(()=>{ alertDiv.style.display='none'; }, 10000);
-}
-
-function blinkBackground(color){
-    const body = document.body;
-    let blink = true;
-    if(flashIntervals[color]) clearInterval(flashIntervals[color]);
-    flashIntervals[color] = setInterval(() => {
-        body.style.backgroundColor = blink ? color : "#222";
-        blink = !blink;
-    }, 500);
-    setTimeout(() => {
-        clearInterval(flashIntervals[color]);
-        body.style.backgroundColor = "#222";
-        delete flashIntervals[color];
-    }, 13000);
-}
-
-async function refreshStatus(){
-    let res = await fetch('/status');
-    let data = await res.json();
-
-    document.getElementById('tasks-status').innerText = data.tasks_done + " / " + data.task_goal;
-
-    // Show ONLY dead players
-    let html = "";
-    for(let [rfid,p] of Object.entries(data.players)){
-        if(!p.alive){
-            html += `<p class="dead">${p.color} (${rfid}) - ${p.death_type.toUpperCase()}</p>`;
-        }
-    }
-    document.getElementById('players-list').innerHTML = html || "<p>No deaths yet</p>";
-
-    // Death alerts
-    for(let [rfid,p] of Object.entries(data.players)){
-        if(!p.alive && !alertedDead[rfid]){
-            alertedDead[rfid] = true;
-            if(p.death_type === "killed"){
-                showAlert(`${p.color} (${rfid}) WAS KILLED!`);
-                blinkBackground(p.color);
-            } else if(p.death_type === "ejected"){
-                showAlert(`${p.color} (${rfid}) WAS EJECTED!`);
-            }
-        }
-    }
-}
-
-document.getElementById('complete-task-btn')?.addEventListener('click', async ()=>{
-    await fetch('/logistics/complete_task', {method:'POST'});
-    await refreshStatus();
-    showAlert("Task complete!");
-});
-
-setInterval(refreshStatus, 1000);
-window.onload = refreshStatus;
-</script>
-
-</body>
-</html>
-
-"""
+# Kept for old clients: meetings now eject their result themselves when they end
+@router.post("/special-logistics/process_eject")
+def process_eject(lobby: Lobby = Depends(current_lobby), run=Depends(idempotent)):
+    return run(lobby.game.process_eject)
 
 
 # ------------------------------
-# Main Hall Page (with JS TTS)
+# Pages and static assets
 # ------------------------------
-@app.get("/", response_class=HTMLResponse)
-def main_hall_page():
-    return """
-<html>
-<head>
-<title>Main Hall</title>
-<style>
-body { font-family: Arial; background-color:#1a1a1a; color:white; text-align:center; }
-h1 { font-size:3em; }
-.container { display:flex; justify-content:space-around; margin-top:50px; }
-.panel { background-color:#333; padding:20px; border-radius:10px; width:30%; }
-#alert { font-size:2em; color:red; display:none; margin-top:20px; }
-#meeting { font-size:2em; color:yellow; display:none; margin-top:10px; }
-#winner-display { font-size:2.5em; color:lime; margin-top:20px; }
-</style>
-</head>
-<body>
-<h1>Game Status</h1>
-<h2 id="winner-display"></h2>
-<div class="container">
-<div class="panel">
-<h2>Time Remaining</h2>
-<p id="time" style="font-size:2.5em;">-</p>
-</div>
-<div class="panel">
-<h2>Tasks Completed</h2>
-<p id="tasks" style="font-size:2.5em;">- / -</p>
-</div>
-<div class="panel">
-<h2>Players Alive</h2>
-<p id="alive-players" style="font-size:2.5em;">- / -</p>
-</div>
-</div>
-<div id="alert"></div>
-<div id="meeting">Meeting in Progress: <span id="meeting-count">-</span></div>
-
-<script>
-let previousAliveState = {};
-let announcedDead = {};
-let winnerAnnounced = false;
-let meetingActive = false;
-let meetingInterval = null;
-let meetingTTSInterval = null;
-let lastTick=null;
-//let audio = new Audio("/static/incorrect-buzzer-sound-147336.mp3");
-//audio.load();
-/*document.addEventListener("click", () => {
-    audio.play().then(() => {
-        audio.pause();
-        audio.currentTime = 0;
-    }).catch(err => console.log("Autoplay unlock failed", err));
-}, {once: true});
-*/
-function speak(msg){
-    if('speechSynthesis' in window){
-        const utter = new SpeechSynthesisUtterance(msg);
-        utter.rate = 1;
-        window.speechSynthesis.speak(utter);
-    }
-}
-
-function showAlert(msg){
-    const alertDiv = document.getElementById('alert');
-    alertDiv.innerText = msg;
-    alertDiv.style.display='block';
-    setTimeout(()=>{ alertDiv.style.display='none'; }, 10000);
-}
-
-function blinkBackground(color){
-    const body = document.body;
-    let blink = true;
-    const intervalId = setInterval(() => {
-        body.style.backgroundColor = blink ? color : "#1a1a1a";
-        blink = !blink;
-    }, 500);
-    setTimeout(() => {
-        clearInterval(intervalId);
-        body.style.backgroundColor = "#1a1a1a";
-    }, 30000);
-}
-
-function resetForNewGame(){
-    winnerAnnounced = false;
-    meetingActive = false;
-    announcedDead = {};
-    if(meetingInterval) clearInterval(meetingInterval);
-    if(meetingTTSInterval) clearInterval(meetingTTSInterval);
-    document.getElementById('winner-display').innerText = "";
-    document.getElementById('meeting').style.display = 'none';
-    previousAliveState = {};
-}
-
-// Main refresh function
-async function refreshStatus(){
-    let res = await fetch('/status');
-    let data = await res.json();
-
-    // Reset for new game start
-    if(data.game_state === "running" && winnerAnnounced && !data.winner){
-        resetForNewGame();
-    }
-
-    // Update main stats
-    document.getElementById('time').innerText = data.time_remaining + "s";
-    document.getElementById('tasks').innerText = data.tasks_done + " / " + data.task_goal;
-    let aliveCount = Object.values(data.players).filter(p=>p.alive).length;
-    document.getElementById('alive-players').innerText = aliveCount + " / " + Object.keys(data.players).length;
-
-    // Handle kills/ejections with 5s TTS delay
-    for(let [rfid, p] of Object.entries(data.players)){
-        if(previousAliveState[rfid] === undefined) previousAliveState[rfid] = p.alive;
-
-        if(previousAliveState[rfid] && !p.alive && !announcedDead[rfid]){
-            announcedDead[rfid] = true;
-            const action = p.death_type;
-            setTimeout(()=>{
-                speak(`${p.color} has been ${action}.`);
-                showAlert(`${p.color} (${action.toUpperCase()})!`);
-                //if(action === "killed") blinkBackground(p.color);
-            }, 5000);
-        }
-
-        previousAliveState[rfid] = p.alive;
-    }
-
-    // Winner announcement
-    if(data.game_state === "ended" && data.winner && !winnerAnnounced){
-        winnerAnnounced = true;
-        let winnerText = data.winner.toUpperCase();
-        document.getElementById('winner-display').innerText = winnerText + " WINS!";
-        if(data.winner === "crewmates") speak("Game over, The Crewmates have won the game!");
-        else if(data.winner === "draw") speak("Draw!");
-        else speak(winnerText + " wins!");
-
-        // Stop any ongoing meeting intervals/TTS
-        if(meetingInterval) clearInterval(meetingInterval);
-        if(meetingTTSInterval) clearInterval(meetingTTSInterval);
-        meetingActive = false;
-        document.getElementById('meeting').style.display = 'none';
-    }
-/*if (data.pre_meeting_alert && !meetingActive) {
-    // wait 5s AFTER kill before beep sequence starts
-    setTimeout(() => {
-        let beepCount = 0;
-
-        function playBeep(){
-            //audio.currentTime = 0;
-            //audio.play().then(() => {
-                beepCount++;
-                if (beepCount < 3) {
-                   // audio.onended = playBeep;  // chain next beep
-                }
-            }).catch(err => console.log("Play blocked:", err));
-        }
-
-        //playBeep();
-    }, 5000);
-}
-*/
-
-
-    // Meeting countdown 10→1 in 30s
-if (data.meeting_remaining > 0 && data.game_state=="running") {
-    // Show meeting UI
-    document.getElementById('meeting').style.display = 'block';
-    document.getElementById('meeting-count').innerText = data.meeting_remaining + "s left";
-
-    // Speak once at the start
-    if (!meetingActive) {
-        meetingActive = true;
-        speak("Meeting started!");
-        showAlert("Meeting started!");
-    }
-
-    // Server-driven TTS countdown
-    if (data.meeting_countdown !== null && data.meeting_countdown !== lastTick) {
-        lastTick = data.meeting_countdown;
-        if (lastTick > 0) {
-            speak(lastTick.toString());
-        } else {
-            speak("Meeting over");
-        }
-    }
-} else {
-    // Meeting ended
-    if (meetingActive) {
-        speak("Meeting over");
-    }
-    document.getElementById('meeting').style.display = 'none';
-    meetingActive = false;
-    lastTick = null;
-}
-
-}
-
-// Refresh every second
-setInterval(refreshStatus, 1000);
-window.onload = refreshStatus;
-</script>
-
-</body>
-</html>
-
-"""
-
-
-
-# ------------------------------
-# Admin Page (Silent)
-# ------------------------------
-@app.get("/admin", response_class=HTMLResponse)
-def admin_page():
-    return """
-<html>
-<head>
-<title>Admin Panel</title>
-<style>
-body { font-family: Arial; text-align:center; margin-top:50px; background-color:#111; color:white; }
-button { font-size:1.2em; padding:10px 30px; margin:5px; cursor:pointer; }
-#announcements { font-size:1.5em; color:yellow; margin-top:20px; }
-#status { font-size:1.5em; margin-top:20px; }
-</style>
-</head>
-<body>
-<h1>Admin Panel</h1>
-<button onclick="startGame()">Start Game</button>
-<button onclick="resetGame()">Reset Game</button>
-
-<div id="status">
-<p>Game State: <span id="game-state">-</span></p>
-<p>Tasks: <span id="tasks">-</span></p>
-<p>Time Remaining: <span id="time">-</span>s</p>
-</div>
-
-<div id="players-list"></div>
-<div id="announcements"></div>
-
-<script>
-let previousAliveState = {};
-let meetingCountdownRunning = false;
-
-function showAnnouncement(msg){
-    const ann = document.getElementById('announcements');
-    ann.innerText = msg;
-    setTimeout(()=>{ ann.innerText=''; }, 10000);
-}
-
-async function startGame(){ await fetch('/start',{method:'POST'}); refreshStatus(); }
-async function resetGame(){ await fetch('/reset',{method:'POST'}); refreshStatus(); }
-async function ejectPlayer(rfid){ await fetch('/eject/'+rfid,{method:'POST'}); refreshStatus(); }
-
-async function refreshStatus(){
-    let res = await fetch('/status'); 
-    let data = await res.json();
-
-    // ----------------------------
-    // Stop meeting if game ended
-    // ----------------------------
-    if(data.game_state !== "running" && meetingCountdownRunning){
-        if(meetingTTSInterval) clearInterval(meetingTTSInterval);
-        if(meetingInterval) clearInterval(meetingInterval);
-        document.getElementById('meeting').style.display = 'none';
-        meetingCountdownRunning = false;
-    }
-
-    document.getElementById('game-state').innerText = data.game_state.toUpperCase();
-    document.getElementById('tasks').innerText = data.tasks_done + " / " + data.task_goal;
-    document.getElementById('time').innerText = data.time_remaining;
-
-    let html='';
-    for(let [rfid,p] of Object.entries(data.players)){
-        html+=`<p>${rfid} (${p.color}) - ${p.role} - ${p.alive?'ALIVE':'DEAD'} <button onclick="ejectPlayer('${rfid}')">Eject</button></p>`;
-    }
-    document.getElementById('players-list').innerHTML = html;
-
-    for(let [rfid,p] of Object.entries(data.players)){
-        if(previousAliveState[rfid]===undefined) previousAliveState[rfid] = p.alive;
-        if(previousAliveState[rfid] && !p.alive){
-            showAnnouncement(`${p.color} (${rfid}) DIED!`);
-        }
-        previousAliveState[rfid] = p.alive;
-    }
-
-    if(data.meeting_remaining>0 && !meetingCountdownRunning){
-        meetingCountdownRunning = true;
-        let count=1;
-        showAnnouncement('Meeting Started!');
-        const interval = setInterval(()=>{
-            showAnnouncement('Meeting in progress: '+count+'/10');
-            count++;
-            if(count>10){ clearInterval(interval); meetingCountdownRunning=false; }
-        }, 3000);
-    }
-
-    if(data.winner){
-        if(data.winner=="draw") showAnnouncement("DRAW!");
-        else showAnnouncement(data.winner.toUpperCase()+" WINS!");
-    }
-}
-
-
-setInterval(refreshStatus,1000);
-window.onload = refreshStatus;
-</script>
-</body>
-</html>
-"""
-
-if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+# Page HTML/CSS/JS lives in static/. Startup only reads and hashes the CSS/JS,
+# which are served under content-hashed names and cached forever; pages are
+# loaded, and every file compressed, on its first request.
+assets = AssetStore()
+
+@app.get("/static/{name}")
+def static_file(request: Request, name: str):
+    return assets.static(request, name)
+
+# Pages check their lobby like the API routes: an unknown or evicted lobby is a 404,
+# not a page whose status stream retries a 404 endpoint forever
+@router.get("/special-logistics", response_class=HTMLResponse, dependencies=[Depends(current_lobby)])
+def special_logistics_page(request: Request):
+    return assets.page(request, "special_logistics.html")
+
+@router.get("/logistics", response_class=HTMLResponse, dependencies=[Depends(current_lobby)])
+def logistics_page(request: Request):
+    return assets.page(request, "logistics.html")
+
+@router.get("/", response_class=HTMLResponse, dependencies=[Depends(current_lobby)])
+def main_hall_page(request: Request):
+    return assets.page(request, "main_hall.html")
+
+@router.get("/admin", response_class=HTMLResponse, dependencies=[Depends(current_lobby)])
+def admin_page(request: Request):
+    return assets.page(request, "admin.html")
+
+app.include_router(router)
+app.include_router(router, prefix="/lobby/{lobby_id}")
@@ -0,0 +1,146 @@
+# File: metrics.py
+"""In-process metrics in the Prometheus text format, served at /metrics.
+
+Cheap enough to leave on: recording is a dict lookup, a bisect and a few
+additions under a lock; gauges are only computed when scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+SERIALIZE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+
+registry = []
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self.lock:
+            items = list(self.values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.values = {}  # labels -> [count per bucket..., +Inf count, sum]
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            row = self.values.get(labels)
+            if row is None:
+                row = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self.lock:
+            items = [(labels, list(row)) for labels, row in self.values.items()]
+        names = self.labels + ("le",)
+        for labels, row in items:
+            cumulative = 0
+            for le, count in zip(self.buckets + ("+Inf",), row):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {row[-1]}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Gauge:
+    """A value computed at scrape time by `collect`, which returns [(label values, value), ...]."""
+
+    def __init__(self, name, help, labels=(), collect=None):
+        self.name, self.help, self.labels = name, help, labels
+        self.collect = collect
+        registry.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self.collect() if self.collect else ():
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+def render_metrics():
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+# ------------------------------
+# Metrics recorded by the server
+# ------------------------------
+REQUESTS = Counter("amongus_http_requests_total", "HTTP requests by route, method and status.",
+                   ("route", "method", "status"))
+REQUEST_LATENCY = Histogram("amongus_http_request_duration_seconds",
+                            "Time from request to response headers, by route.", ("route", "method"))
+TIMER_LAG = Histogram("amongus_timer_lag_seconds",
+                      "How late scheduled game timers (meeting_start, meeting_end, ...) fire.",
+                      ("job",), LAG_BUCKETS)
+STATUS_SERIALIZE = Histogram("amongus_status_serialize_seconds",
+                             "Time spent serializing a fresh /status body.", (), SERIALIZE_BUCKETS)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request up to its response headers.
+
+    Routes are labelled by their path template with the /lobby/{lobby_id}
+    prefix removed, so every lobby counts towards the same series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        recorded = False
+
+        async def timed_send(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start":
+                recorded = True
+                self._record(scope, message["status"], time.perf_counter() - start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        except Exception:
+            if not recorded:
+                self._record(scope, 500, time.perf_counter() - start)
+            raise
+
+    @staticmethod
+    def _record(scope, status, elapsed):
+        route = scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        if path.startswith("/lobby/{lobby_id}/"):
+            path = path[len("/lobby/{lobby_id}"):]
+        REQUESTS.inc(path, scope["method"], status)
+        REQUEST_LATENCY.observe(elapsed, path, scope["method"])
@@ -0,0 +1,142 @@
+# File: reader.py
+"""Compact binary protocol for the ESP32 RFID readers.
+
+One frame carries any number of taps (e.g. the ones queued while Wi-Fi was
+down) and is answered with one ack frame. All integers are little-endian.
+
+Tap frame:
+    u8 version, u8 reader id length, reader id (ASCII), u8 tap count,
+    then per tap: u16 seq, u8 action, u8 data length, data
+
+Ack frame:
+    u8 version, u8 ack count,
+    then per tap: u16 seq, u8 status, u8 text length, text (UTF-8)
+
+The reader id is the player RFID the device was registered as. A tap's data
+is the scanned card UID (raw bytes) for KILL, ROLE and VOTE, the color for
+CONNECT, and empty for TASK (and for a VOTE to skip). The (reader id, seq) pair is the tap's idempotency key,
+so resending a batch after a lost ack never applies a tap twice.
+"""
+import struct
+
+from game import SKIP
+from idempotency import KeyReused
+
+
+VERSION = 1
+ACTION_CONNECT = 1  # data: color; registers the reader's own RFID
+ACTION_KILL = 2     # data: impostor card UID; the reader's player is the victim
+ACTION_ROLE = 3     # data: card UID; ack text is the role line for the LCD
+ACTION_TASK = 4     # data: none
+ACTION_VOTE = 5     # data: card UID of the player voted for, or none to skip; the reader's player votes
+
+STATUS_OK = 0
+STATUS_REJECTED = 1  # the game refused the tap (cooldown, dead target, ...); text says why
+STATUS_INVALID = 2   # unknown action or malformed data
+STATUS_REPLAYED = 0x80  # or'ed in when the ack is the stored reply of an earlier delivery
+
+MAX_TEXT = 64  # bytes of reply text per ack; the LCD shows 32
+
+_TAP = struct.Struct("<HBB")  # seq, action, data length
+_ACK = struct.Struct("<HBB")  # seq, status, text length
+
+
+class FrameError(ValueError):
+    pass
+
+
+def decode_taps(frame):
+    """Returns (reader_id, [(seq, action, data), ...]) or raises FrameError."""
+    try:
+        version, id_len = frame[0], frame[1]
+        if version != VERSION:
+            raise FrameError(f"unsupported version {version}")
+        reader_id = frame[2:2 + id_len].decode("ascii")
+        pos = 2 + id_len
+        count = frame[pos]
+        pos += 1
+        taps = []
+        for _ in range(count):
+            seq, action, data_len = _TAP.unpack_from(frame, pos)
+            pos += _TAP.size
+            data = bytes(frame[pos:pos + data_len])
+            if len(data) != data_len:
+                raise FrameError("truncated tap")
+            pos += data_len
+            taps.append((seq, action, data))
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise FrameError(f"malformed frame: {e}") from None
+    if pos != len(frame) or not reader_id:
+        raise FrameError("malformed frame")
+    return reader_id, taps
+
+
+def encode_taps(reader_id, taps):
+    """The inverse of decode_taps, for Python clients such as bench.py."""
+    rid = reader_id.encode("ascii")
+    parts = [bytes((VERSION, len(rid))), rid, bytes((len(taps),))]
+    for seq, action, data in taps:
+        parts.append(_TAP.pack(seq, action, len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def encode_acks(acks):
+    parts = [bytes((VERSION, len(acks)))]
+    for seq, status, text in acks:
+        raw = text.encode("utf-8")[:MAX_TEXT].decode("utf-8", "ignore").encode("utf-8")
+        parts.append(_ACK.pack(seq, status, len(raw)))
+        parts.append(raw)
+    return b"".join(parts)
+
+
+def decode_acks(frame):
+    count, pos, acks = frame[1], 2, []
+    for _ in range(count):
+        seq, status, text_len = _ACK.unpack_from(frame, pos)
+        pos += _ACK.size
+        acks.append((seq, status, frame[pos:pos + text_len].decode("utf-8")))
+        pos += text_len
+    return acks
+
+
+def uid_hex(data):
+    """Card UID bytes -> the uppercase hex string the HTTP API uses as RFID."""
+    return data.hex().upper()
+
+
+def _apply(game, reader_id, action, data):
+    """Runs one tap against the game; returns (status, text)."""
+    if action == ACTION_CONNECT:
+        result = game.connect(reader_id, data.decode("utf-8", "replace"))
+    elif action == ACTION_KILL:
+        result = game.kill(uid_hex(data), reader_id)
+    elif action == ACTION_ROLE:
+        return STATUS_OK, game.role_text(uid_hex(data))
+    elif action == ACTION_TASK:
+        result = game.complete_task()
+    elif action == ACTION_VOTE:
+        result = game.vote(reader_id, uid_hex(data) if data else SKIP)
+    else:
+        return STATUS_INVALID, f"unknown action {action}"
+    if "error" in result:
+        return STATUS_REJECTED, result["error"]
+    return STATUS_OK, result.get("status", "ok")
+
+
+def handle_frame(lobby, frame):
+    """Applies every tap in a frame to `lobby`, at most once per (reader id, seq); returns the ack frame."""
+    reader_id, taps = decode_taps(frame)
+    acks = []
+    for seq, action, data in taps:
+        if action == ACTION_ROLE:
+            acks.append((seq, *_apply(lobby.game, reader_id, action, data)))  # read-only; nothing to dedupe
+            continue
+        try:
+            (status, text), replayed = lobby.replies.run(
+                f"reader:{reader_id}:{seq}", ("reader", action, data), _apply, lobby.game, reader_id, action, data)
+        except KeyReused:
+            acks.append((seq, STATUS_INVALID, "sequence number reused"))
+            continue
+        acks.append((seq, status | (STATUS_REPLAYED if replayed else 0), text))
+    return encode_acks(acks)
@@ -9,7 +9,14 @@ const char* ssid = "YourWiFiSSID";
 const char* password = "YourWiFiPassword";
 
 // --------- Server Setup ----------
-const char* serverURL = "http://192.168.196.222:8000/role/"; // change to your server
+const char* serverURL = "http://192.168.196.222:8000/reader"; // change to your server
+const char* readerId = "ROLE1";  // any id; role lookups don't change the game
+
+// Role lookups go over one kept-alive connection as binary frames (see reader.py)
+#define ACTION_ROLE 3
+WiFiClient net;
+HTTPClient http;
+uint16_t nextSeq = 0;
 
 // --------- LCD Setup ----------
 LiquidCrystal_I2C lcd(0x27, 16, 2); // 16x2 LCD
@@ -67,14 +74,14 @@ void loop() {
   // Only fetch role if new card or first scan
   if (uidStr != lastUID) {
     lastUID = uidStr;
-    fetchAndDisplayRole(uidStr);
+    fetchAndDisplayRole(mfrc522.uid.uidByte, mfrc522.uid.size);
   }
 
   // Keep displaying the same role while card is present
   delay(500);
 }
 
-void fetchAndDisplayRole(String rfid) {
+void fetchAndDisplayRole(const uint8_t* uid, uint8_t uidSize) {
   if (WiFi.status() != WL_CONNECTED) {
     lcd.clear();
     lcd.setCursor(0, 0);
@@ -82,24 +89,40 @@ void fetchAndDisplayRole(String rfid) {
     return;
   }
 
-  HTTPClient http;
-  String url = String(serverURL) + rfid;
-  http.begin(url);
-  int httpCode = http.GET();
-
-  if (httpCode > 0) {
-    String payload = http.getString();
+  // Tap frame: version, reader id, one tap (seq, action, UID)
+  uint8_t frame[3 + 32 + 4 + 10];
+  int n = 0;
+  uint8_t idLen = strlen(readerId);
+  frame[n++] = 1;
+  frame[n++] = idLen;
+  memcpy(frame + n, readerId, idLen);
+  n += idLen;
+  frame[n++] = 1;
+  frame[n++] = nextSeq & 0xFF;
+  frame[n++] = nextSeq >> 8;
+  nextSeq++;
+  frame[n++] = ACTION_ROLE;
+  frame[n++] = uidSize;
+  memcpy(frame + n, uid, uidSize);
+  n += uidSize;
+
+  http.setReuse(true);
+  http.begin(net, serverURL);
+  http.addHeader("Content-Type", "application/octet-stream");
+  int httpCode = http.POST(frame, n);
+
+  if (httpCode == 200) {
+    // Ack frame: version, count, seq (2), status, text length, text
+    uint8_t ack[80];
+    int size = http.getStreamPtr()->readBytes(ack, min(http.getSize(), (int)sizeof(ack)));
+    String payload = "";
+    for (int i = 6; i < 6 + ack[5] && i < size; i++) payload += (char)ack[i];
     Serial.println("Role: " + payload);
-    lcd.clear();
-    if (payload.length() <= 16) {
-      lcd.setCursor(0, 0);
-      lcd.print(payload);
-    } else {
-      lcd.setCursor(0, 0);
-      lcd.print(payload.substring(0, 16));
-      lcd.setCursor(0, 1);
-      lcd.print(payload.substring(16));
-    }
+    // Always two full 16-character lines, so they overwrite the LCD without a clear
+    lcd.setCursor(0, 0);
+    lcd.print(payload.substring(0, 16));
+    lcd.setCursor(0, 1);
+    lcd.print(payload.substring(16, 32));
   } else {
     lcd.clear();
     lcd.setCursor(0, 0);
@@ -0,0 +1,478 @@
+# File: simulator.py
+"""Headless games on a virtual clock: outcome distributions, invariant checks and log replays.
+
+    python simulator.py run --games 10000 --seed 1
+    python simulator.py run --games 10000 --set kill_cooldown=45 impostor_win_kills=4
+    python simulator.py run --seed 4711 --games 1 --dump-log /tmp/4711.log
+    python simulator.py replay data/main.log
+    python simulator.py replay data/state.db --lobby main --set kill_cooldown=45
+
+run plays seeded games against GameState itself: scripted players tap tasks,
+kill and vote, and the game timers fire on a virtual clock, so a 10-minute
+game takes a few milliseconds of CPU, and --jobs spreads the games over
+every core. The same seed always plays the same game. Every transition is
+followed by check_invariants(), and every game's events by outcome checks;
+a failing game is reported with its seed.
+
+replay applies a recorded event log (a lobby's .log file, or the sqlite
+backend's state.db) and checks the invariants after every event. At the same
+time it re-sends the log's requests (taps, votes, kills) to a second game at
+their recorded times, with the game parameters given by --set, and prints
+each round's recorded outcome next to the replayed one.
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from backend import SQLiteBackend
+from clock import NS, FakeClock, parse_time, seconds
+from eventlog import EventLog
+from game import SKIP, TIMER_SLACK, GameState, player_color
+from lobby import DEFAULT_LOBBY
+
+
+# Scripted players; all times are in seconds
+TASK_INTERVAL = 120   # mean time between one alive crewmate's tasks
+KILL_DELAY = 30       # mean time an impostor takes to find a victim once its cooldown is over
+VOTE_ACCURACY = 0.35  # chance a crewmate votes for an impostor; otherwise another player or skip
+SKIP_RATE = 0.3       # chance a crewmate's uninformed vote is a skip
+
+
+# ------------------------------
+# Virtual time
+# ------------------------------
+class VirtualScheduler:
+    """GameScheduler's interface on a FakeClock; run_until() fires the jobs that are due."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.jobs = {}  # name -> (when, callback)
+
+    def start(self, loop=None):
+        pass
+
+    def stop(self):
+        self.jobs.clear()
+
+    def schedule(self, name, delay, callback):
+        self.jobs[name] = (self.clock.now() + seconds(delay), callback)
+
+    def cancel_all(self):
+        self.jobs.clear()
+
+    def next_due(self):
+        return min((when for when, _ in self.jobs.values()), default=None)
+
+    def run_until(self, until):
+        """Fires every job due by `until` (a clock reading) in time order (jobs may schedule more),
+        then sets the clock to it."""
+        while True:
+            due = [(when, name) for name, (when, _) in self.jobs.items() if when <= until]
+            if not due:
+                break
+            when, name = min(due)
+            _, callback = self.jobs.pop(name)
+            self.clock.advance_to(when)
+            callback()
+        self.clock.advance_to(until)
+
+
+class MemoryLog:
+    """A GameState log that keeps the events in a list, for outcome checks and --dump-log."""
+
+    shared = False
+
+    def __init__(self):
+        self.events = []
+
+    def append(self, seq, event):
+        self.events.append({"seq": seq, **event})
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            for event in self.events:
+                f.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+
+def virtual_game(settings=None, seed=None):
+    """A GameState on its own fake clock and scheduler, logging to a MemoryLog."""
+    clock = FakeClock()
+    game = GameState(scheduler=VirtualScheduler(clock), log=MemoryLog(), clock=clock)
+    game.rng = random.Random(seed)
+    game.configure(**(settings or {}))
+    return game
+
+
+# ------------------------------
+# Checks
+# ------------------------------
+def outcome_errors(game):
+    """Rules a finished game's events must follow, beyond check_invariants()."""
+    errors = []
+    events = game.log.events
+    start = next(e["t"] for e in events if e["type"] == "start")
+    end = events[-1]["t"]
+    winner = game.game_winner
+    if game.game_state != "ended" or winner is None:
+        errors.append(f"game still {game.game_state} after its last event")
+    elif winner == "crewmates" and game.total_tasks_done < game.task_goal and game.players.alive["impostor"]:
+        errors.append("crewmates won without the tasks or the impostors dead")
+    elif winner == "impostors" and game.impostor_kill_count < game.impostor_win_kills:
+        errors.append(f"impostors won with {game.impostor_kill_count}/{game.impostor_win_kills} kills")
+    elif winner == "jester" and not any(p.role == "jester" and p.death_type == "ejected"
+                                        for p in game.players.values()):
+        errors.append("jester won without being ejected")
+    elif winner == "draw" and end - start < seconds(game.game_duration) - TIMER_SLACK:
+        errors.append(f"draw after {(end - start) / NS:.0f}s of {game.game_duration}s")
+    if end - start > seconds(game.game_duration) + TIMER_SLACK:
+        errors.append(f"game ran {(end - start) / NS:.0f}s, past its {game.game_duration}s")
+
+    last_kill = {}
+    for e in events:
+        if e["type"] != "kill":
+            continue
+        t = e["t"]
+        previous = last_kill.get(e["impostor"])
+        if previous is not None and t - previous < game.kill_cooldown:
+            errors.append(f"{e['impostor']} killed again after {(t - previous) / NS:.0f}s, "
+                          f"inside the {game.kill_cooldown / NS:.0f}s cooldown")
+        last_kill[e["impostor"]] = t
+    return errors
+
+
+# ------------------------------
+# Simulated games
+# ------------------------------
+def play(seed, players=10, settings=None, check=True, task_interval=TASK_INTERVAL, kill_delay=KILL_DELAY,
+         vote_accuracy=VOTE_ACCURACY, skip_rate=SKIP_RATE):
+    """Plays one game with scripted players; returns (game, errors)."""
+    rng = random.Random(seed)
+    game = virtual_game(settings, seed=rng.random())
+    clock, scheduler = game.clock, game.scheduler
+    errors = []
+
+    def checked(call, *args):
+        result = call(*args)
+        if check:
+            errors.extend(game.check_invariants())
+        return result
+
+    if game.required_players is not None:
+        game.required_players = max(game.required_players, players)
+    for i in range(players):
+        game.connect(f"P{i}", player_color(i))
+    game.reset()
+    checked(game.start)
+
+    actions = []  # heap of (when, tie-break, action, rfid)
+    order = 0
+
+    def later(delay, action, rfid):
+        nonlocal order
+        order += 1
+        heapq.heappush(actions, (clock.now() + seconds(delay), order, action, rfid))
+
+    def meeting_over():
+        """Seconds until the running meeting ends, 0 outside meetings."""
+        if not game.meeting_active:
+            return 0
+        return max(game.meeting_ends - clock.now(), 0) / NS
+
+    def alive(role=None):
+        return [rfid for rfid, p in game.players.items() if p.alive and (role is None or p.role == role)]
+
+    for rfid, p in game.players.items():
+        if p.role == "crewmate":
+            later(rng.expovariate(1 / task_interval), "task", rfid)
+        elif p.role == "impostor":
+            later(rng.expovariate(1 / kill_delay), "kill", rfid)
+
+    meeting_seen = None
+    while game.game_state == "running":
+        due = scheduler.next_due()
+        if actions and (due is None or actions[0][0] < due):
+            when, _, action, rfid = heapq.heappop(actions)
+            scheduler.run_until(when)
+        elif due is not None:
+            scheduler.run_until(due)
+            action = None
+        else:
+            break
+        if game.game_state != "running":
+            break
+        if check and action is None:
+            errors.extend(game.check_invariants())
+
+        # Everybody votes at some point during each new meeting
+        if game.meeting_active and game.meeting_start_time != meeting_seen:
+            meeting_seen = game.meeting_start_time
+            for voter in alive():
+                later(rng.uniform(0, game.meeting_duration * 0.9), "vote", voter)
+
+        if action is None or not game.players[rfid].alive:
+            continue
+        if action == "vote":
+            if not game.meeting_active:
+                continue
+            role = game.players[rfid].role
+            impostors = alive("impostor")
+            if role == "crewmate" and impostors and rng.random() < vote_accuracy:
+                target = rng.choice(impostors)
+            elif role == "crewmate" and rng.random() < skip_rate:
+                target = SKIP
+            else:
+                others = [r for r in alive() if r != rfid and (role != "impostor" or r not in impostors)]
+                target = rng.choice(others) if others else SKIP
+            checked(game.vote, rfid, target)
+        elif game.meeting_active:
+            later(meeting_over() + rng.expovariate(1 / (task_interval if action == "task" else kill_delay)),
+                  action, rfid)  # nobody taps or kills in the meeting room
+        elif action == "task":
+            checked(game.complete_task)
+            later(rng.expovariate(1 / task_interval), "task", rfid)
+        elif action == "kill":
+            cooldown = game.players[rfid].kill_ready - clock.now()
+            targets = [r for r in alive() if game.players[r].role != "impostor"]
+            if cooldown > 0:
+                later(cooldown / NS + rng.expovariate(1 / kill_delay), "kill", rfid)
+            elif targets:
+                checked(game.kill, rfid, rng.choice(targets))
+                later(game.kill_cooldown / NS + rng.expovariate(1 / kill_delay), "kill", rfid)
+
+    if check:
+        errors.extend(outcome_errors(game))
+    return game, errors
+
+
+def outcome(game):
+    """The numbers one finished game adds to the distribution."""
+    events = game.log.events
+    start = next(e["t"] for e in events if e["type"] == "start")
+    ejected = [p for p in game.players.values() if p.death_type == "ejected"]
+    return {
+        "winner": game.game_winner,
+        "duration": (events[-1]["t"] - start) / NS,
+        "kills": game.impostor_kill_count,
+        "ejects": len(ejected),
+        "wrong_ejects": sum(1 for p in ejected if p.role != "impostor"),
+        "tasks": game.total_tasks_done,
+        "meetings": sum(1 for e in events if e["type"] == "meeting_start"),
+    }
+
+
+def play_many(seeds, *args, **kwargs):
+    """[(seed, outcome, errors)] for each seed; one worker's share of run()."""
+    results = []
+    for seed in seeds:
+        game, errors = play(seed, *args, **kwargs)
+        results.append((seed, outcome(game), errors))
+    return results
+
+
+def summarize_games(outcomes):
+    """Outcome distribution of finished games."""
+    winners = Counter(o["winner"] for o in outcomes)
+    durations = sorted(o["duration"] for o in outcomes)
+    summary = {
+        "winners": {winner: round(100 * n / len(outcomes), 1) for winner, n in winners.most_common()},
+        "duration_p50_s": round(durations[len(durations) // 2], 1),
+        "duration_p90_s": round(durations[int(len(durations) * 0.9)], 1),
+    }
+    for name in ("kills", "ejects", "wrong_ejects", "tasks", "meetings"):
+        summary[name + "_mean"] = round(statistics.mean(o[name] for o in outcomes), 2)
+    return summary
+
+
+def run(games=1000, seed=0, players=10, settings=None, check=True, jobs=None, dump_log=None, **behaviour):
+    """Plays `games` seeded games (seed, seed+1, ...); prints the outcome distribution and any violations."""
+    jobs = min(jobs or os.cpu_count() or 1, games)
+    seeds = range(seed, seed + games)
+    started = time.perf_counter()
+    if jobs == 1:
+        results = play_many(seeds, players, settings, check, **behaviour)
+    else:
+        # Each worker plays every jobs-th seed; the outcome doesn't depend on the split
+        with ProcessPoolExecutor(jobs) as pool:
+            shares = [pool.submit(play_many, seeds[i::jobs], players, settings, check, **behaviour)
+                      for i in range(jobs)]
+            results = sorted(r for share in shares for r in share.result())
+    elapsed = time.perf_counter() - started
+    violations = {game_seed: errors for game_seed, _, errors in results if errors}
+    if dump_log:
+        play(seed, players, settings, check=False, **behaviour)[0].log.dump(dump_log)
+        print(f"wrote the events of game {seed} to {dump_log}")
+
+    summary = summarize_games([o for _, o, _ in results])
+    print(f"{games} games of {players} players in {elapsed:.2f} s ({games / elapsed:.0f} games/s, {jobs} processes)")
+    print("winners: " + ", ".join(f"{winner} {pct}%" for winner, pct in summary["winners"].items()))
+    print(f"duration p50 {summary['duration_p50_s']} s, p90 {summary['duration_p90_s']} s; per game: "
+          f"{summary['kills_mean']} kills, {summary['ejects_mean']} ejections "
+          f"({summary['wrong_ejects_mean']} not impostors), {summary['tasks_mean']} tasks, "
+          f"{summary['meetings_mean']} meetings")
+    print(f"games with invariant violations: {len(violations)}/{games}")
+    for game_seed, errors in list(violations.items())[:10]:
+        print(f"  seed {game_seed}: " + "; ".join(dict.fromkeys(errors)))
+    return {"summary": summary, "violations": violations}
+
+
+# ------------------------------
+# Log replay
+# ------------------------------
+def load_log(path, lobby_id=DEFAULT_LOBBY):
+    """(snapshot or None, events) from a lobby's log file, or from the sqlite backend's database."""
+    if path.endswith(".db"):
+        return SQLiteBackend(path).open_log(lobby_id, None).load()
+    return EventLog(path).load()
+
+
+# Requests that logged each event type; the timers' events are left to the replayed game's own timers
+REQUESTS = {
+    "connect": lambda game, e: game.connect(e["rfid"], e["color"]),
+    "start": lambda game, e: game.start(),
+    "kill": lambda game, e: game.kill(e["impostor"], e["target"]),
+    "eject": lambda game, e: game.eject(e["rfid"]),
+    "task": lambda game, e: game.complete_task(),
+    "set_eject": lambda game, e: game.set_eject(e["rfid"] or ""),
+    "vote": lambda game, e: game.vote(e["voter"], e["target"]),
+    "process_eject": lambda game, e: game.process_eject(),
+}
+
+
+class Rounds:
+    """Each round's outcome (winner, seconds) as a game goes through its events."""
+
+    def __init__(self, game):
+        self.game = game
+        self.results = []
+        self.started = None
+
+    def update(self):
+        game = self.game
+        if game.game_state == "running" and self.started is None:
+            self.started = game.game_start_time
+        elif game.game_state != "running" and self.started is not None:
+            if game.game_state == "ended":
+                self.results.append((game.game_winner, (game.clock.now() - self.started) / NS))
+            else:
+                self.results.append(("reset", (game.clock.now() - self.started) / NS))
+            self.started = None
+
+    def finish(self):
+        """Closes a round still running at the end of the log."""
+        if self.started is not None:
+            self.results.append(("running", (self.game.clock.now() - self.started) / NS))
+
+
+def _replay_reset(game, event):
+    """A reset with the recorded roles; the thresholds follow the replayed game's parameters."""
+    with game.lock:
+        game.scheduler.cancel_all()
+        game._emit("reset", roles=event["roles"], **game._scaled_thresholds())
+
+
+def replay(path, lobby=DEFAULT_LOBBY, settings=None, verbose=False):
+    """Checks a recorded log event by event and replays its requests with `settings`."""
+    snapshot, events = load_log(path, lobby)
+    if not events:
+        sys.exit(f"{path}: no events to replay" + (f" after its snapshot at event {snapshot['seq']}" if snapshot else ""))
+    recorded, rerun = virtual_game(), virtual_game(settings)
+    for game in (recorded, rerun):
+        game.clock.advance_to(parse_time(events[0]["t"]))
+        if snapshot is not None:
+            game._load_state(snapshot["seq"], snapshot["state"])
+            game._resume_timers()
+    rounds = {"recorded": Rounds(recorded), "replayed": Rounds(rerun)}
+    violations, rejected = [], Counter()
+
+    first = parse_time(events[0]["t"])
+    for event in events:
+        t = parse_time(event["t"])
+        recorded.clock.advance_to(t)
+        with recorded.lock:
+            recorded._apply(event)
+            recorded.version = event["seq"]
+        for error in recorded.check_invariants():
+            violations.append(f"event {event['seq']} ({event['type']}): {error}")
+        rounds["recorded"].update()
+
+        rerun.scheduler.run_until(t)
+        rounds["replayed"].update()
+        if event["type"] == "reset":
+            _replay_reset(rerun, event)
+        elif event["type"] in REQUESTS:
+            result = REQUESTS[event["type"]](rerun, event)
+            if isinstance(result, dict) and "error" in result:
+                rejected[event["type"]] += 1
+                if verbose:
+                    print(f"{(t - first) / NS:8.1f}s {event['type']} rejected: {result['error']}")
+        rounds["replayed"].update()
+        if verbose:
+            print(f"{(t - first) / NS:8.1f}s {event['type']:<14} {json.dumps({k: v for k, v in event.items() if k not in ('seq', 't', 'type')})}")
+
+    for game_rounds in rounds.values():
+        game_rounds.finish()
+
+    print(f"{len(events)} events" + (f" after a snapshot at event {snapshot['seq']}" if snapshot else "")
+          + (f"; replayed with {settings}" if settings else ""))
+    print(f"{'round':>6} {'recorded':>22} {'replayed':>22}")
+    recorded_rounds, replayed_rounds = rounds["recorded"].results, rounds["replayed"].results
+    for i in range(max(len(recorded_rounds), len(replayed_rounds))):
+        cells = [f"{r[0]} at {r[1]:.0f}s" if r else "-"
+                 for r in (recorded_rounds[i] if i < len(recorded_rounds) else None,
+                           replayed_rounds[i] if i < len(replayed_rounds) else None)]
+        print(f"{i + 1:>6} {cells[0]:>22} {cells[1]:>22}")
+    print("requests rejected by the replayed game: "
+          + (", ".join(f"{n} {kind}" for kind, n in rejected.items()) if rejected else "none"))
+    print(f"invariant violations: {len(violations)}")
+    for violation in violations[:10]:
+        print("  " + violation)
+    return {"rounds": rounds["recorded"].results, "replayed": rounds["replayed"].results,
+            "rejected": dict(rejected), "violations": violations}
+
+
+def parse_settings(pairs):
+    """["kill_cooldown=45", ...] -> {"kill_cooldown": 45, ...}"""
+    settings = {}
+    for pair in pairs or ():
+        name, _, value = pair.partition("=")
+        settings[name] = json.loads(value)
+    return settings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help=run.__doc__)
+    p.add_argument("--games", type=int, default=1000)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--players", type=int, default=10)
+    p.add_argument("--set", nargs="+", metavar="NAME=VALUE", help="game parameters, as in the config file")
+    p.add_argument("--no-check", dest="check", action="store_false", help="skip the invariant checks")
+    p.add_argument("--jobs", type=int, help="worker processes (default: one per CPU)")
+    p.add_argument("--dump-log", metavar="FILE", help="write the first game's events, for replay")
+    p.add_argument("--task-interval", type=float, default=TASK_INTERVAL)
+    p.add_argument("--kill-delay", type=float, default=KILL_DELAY)
+    p.add_argument("--vote-accuracy", type=float, default=VOTE_ACCURACY)
+    p.add_argument("--skip-rate", type=float, default=SKIP_RATE)
+
+    p = sub.add_parser("replay", help=replay.__doc__)
+    p.add_argument("path", help="a lobby's .log file, or the sqlite backend's state.db")
+    p.add_argument("--lobby", default=DEFAULT_LOBBY, help="lobby to read from a state.db")
+    p.add_argument("--set", nargs="+", metavar="NAME=VALUE", help="game parameters for the replayed game")
+    p.add_argument("-v", "--verbose", action="store_true", help="print every event")
+
+    args = vars(parser.parse_args())
+    command = args.pop("command")
+    args["settings"] = parse_settings(args.pop("set"))
+    try:
+        result = run(**args) if command == "run" else replay(**args)
+    except ValueError as e:
+        parser.error(str(e))
+    sys.exit(1 if result["violations"] else 0)
@@ -0,0 +1,63 @@
+let lastMeetingStep = null;
+
+function showAnnouncement(msg){
+    showAlert(msg, 'announcements');
+}
+
+async function startGame(){ await fetch(BASE + '/start',{method:'POST'}); game.refresh(); }
+async function resetGame(){ await fetch(BASE + '/reset',{method:'POST'}); game.refresh(); }
+async function ejectPlayer(rfid){ await fetch(BASE + '/eject/'+rfid,{method:'POST'}); game.refresh(); }
+
+// Every player with an Eject button; a row is only rewritten when its text changes
+const playerList = new PlayerList('players-list', {
+    key: (rfid, p) => `${p.color}|${p.role}|${p.alive}`,
+    create: () => {
+        const el = document.createElement('p');
+        const button = document.createElement('button');
+        button.textContent = 'Eject';
+        el.append(document.createElement('span'), ' ', button);
+        return el;
+    },
+    update: (el, rfid, p) => {
+        el.firstChild.textContent = `${rfid} (${p.color}) - ${p.role} - ${p.alive?'ALIVE':'DEAD'}`;
+    }
+});
+playerList.onClick((rfid, e) => {
+    if(e.target.closest('button')) ejectPlayer(rfid);
+});
+
+game.on('status', (data) => {
+    setText('game-state', data.game_state.toUpperCase());
+    setText('tasks', data.tasks_done + " / " + data.task_goal);
+    playerList.render(data.players);
+    renderClock();
+});
+
+game.on('playerDied', (rfid, p) => showAnnouncement(`${p.color} (${rfid}) DIED!`));
+
+game.on('gameEnded', (winner) => {
+    if(winner=="draw") showAnnouncement("DRAW!");
+    else if(winner) showAnnouncement(winner.toUpperCase()+" WINS!");
+});
+
+// Countdowns run locally against the server's absolute times; the meeting
+// progress follows the same server countdown the main hall speaks
+function renderClock(){
+    const data = game.status;
+    if(!data) return;
+    setText('time', data.game_state === "running" ? serverClock.secondsUntil(data.game_ends_at) : 0);
+
+    const countdown = data.game_state === "running" ? meetingCountdown(data) : null;
+    if(countdown === null){
+        lastMeetingStep = null;
+        return;
+    }
+    const step = Math.min(11 - countdown, 10);
+    if(step !== lastMeetingStep){
+        showAnnouncement(lastMeetingStep === null ? 'Meeting Started!' : 'Meeting in progress: '+step+'/10');
+        lastMeetingStep = step;
+    }
+}
+setInterval(renderClock, 200);
+
+game.connect();
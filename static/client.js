@@ -0,0 +1,260 @@
+// Shared by every page: the lobby's status stream, the server clock, alerts
+// and keyed player lists. Pages subscribe to game events (game.on(...)) and
+// render from game.status instead of diffing snapshots themselves.
+
+// Lobby pages live under /lobby/{id}/, the default lobby at the root
+const BASE = location.pathname.startsWith('/lobby/') ? location.pathname.split('/').slice(0, 3).join('/') : '';
+
+// ------------------------------
+// Status stream
+// ------------------------------
+// One EventSource per tab. The server pushes a full snapshot on connect, then
+// only what changed; after a drop the stream is reopened with backoff and
+// resumes from the last version seen, so nothing is missed while offline.
+//
+// Events, all relative to the previous status this tab saw (the first status
+// only sets the baseline, so reloading a page doesn't replay old news):
+//   status(data, changed)   every update; changed holds the players in it
+//   playerDied(rfid, p)     alive -> dead, killed or ejected
+//   meetingStarted(data), meetingEnded(data)
+//   gameStarted(data)       running, after waiting or a previous round
+//   gameEnded(winner, data)
+const game = {
+    status: null,
+    handlers: {},
+    stream: null,
+    retries: 0,
+
+    on(event, callback){
+        (this.handlers[event] = this.handlers[event] || []).push(callback);
+        return this;
+    },
+
+    emit(event, ...args){
+        for(const callback of this.handlers[event] || []){
+            try { callback(...args); } catch(err) { console.error(event, err); }
+        }
+    },
+
+    connect(){
+        const since = this.status ? '?since=' + this.status.version : '';
+        const stream = this.stream = new EventSource(BASE + '/status/stream' + since);
+        stream.onmessage = (e) => {
+            this.retries = 0;
+            this.apply(JSON.parse(e.data));
+        };
+        // EventSource retries some drops itself but gives up on others (a 502
+        // while the server restarts); reopening ourselves covers both
+        stream.onerror = () => {
+            stream.close();
+            const delay = Math.min(30000, 500 * 2 ** this.retries++) * (0.5 + Math.random() / 2);
+            setTimeout(() => this.connect(), delay);
+        };
+    },
+
+    // After a page's own request, to show its effect before the push arrives
+    async refresh(){
+        try {
+            const since = this.status ? '?since=' + this.status.version : '';
+            const res = await fetch(BASE + '/status' + since);
+            if(res.ok) this.apply(await res.json());
+        } catch(err) {
+            console.log("Status refresh failed; the stream will catch up", err);
+        }
+    },
+
+    apply(msg){
+        const old = this.status;
+        if(old && msg.version <= old.version && msg.delta) return;  // already seen via the other path
+        const data = msg.delta
+            ? Object.assign({}, old, msg, {players: Object.assign({}, old.players, msg.players)})
+            : msg;
+        this.status = data;
+        if(old) this.changes(old, data);
+        this.emit('status', data, msg.delta ? msg.players : data.players);
+    },
+
+    changes(old, data){
+        if(data.game_state !== old.game_state && data.game_state !== "ended") clearEffects();
+        if(data.game_state === "running" && old.game_state !== "running") this.emit('gameStarted', data);
+        for(const [rfid, p] of Object.entries(data.players)){
+            const before = old.players[rfid];
+            if(!p.alive && (!before || before.alive)) this.emit('playerDied', rfid, p);
+        }
+        if(data.meeting_active && !old.meeting_active) this.emit('meetingStarted', data);
+        if(!data.meeting_active && old.meeting_active) this.emit('meetingEnded', data);
+        if(data.game_state === "ended" && old.game_state !== "ended") this.emit('gameEnded', data.winner, data);
+    }
+};
+
+// ------------------------------
+// Server clock
+// ------------------------------
+// /status publishes absolute server times (ms since the epoch); pages count
+// down to them locally, using an offset estimated from /clock.
+const serverClock = {
+    offset: 0,  // server time minus local time, in ms
+
+    // Keeps the sample with the shortest round trip, whose midpoint is the most accurate
+    async sync(samples = 5){
+        let best = null;
+        for(let i = 0; i < samples; i++){
+            const t0 = Date.now();
+            const res = await fetch('/clock', {cache: 'no-store'});
+            const {now} = await res.json();
+            const t1 = Date.now();
+            if(best === null || t1 - t0 < best.rtt) best = {rtt: t1 - t0, offset: now - (t0 + t1) / 2};
+        }
+        this.offset = best.offset;
+    },
+
+    now(){ return Date.now() + this.offset; },
+
+    // Whole seconds left until a server time, like the old time_remaining fields
+    secondsUntil(at){ return at == null ? 0 : Math.max(0, Math.ceil((at - this.now()) / 1000)); }
+};
+serverClock.sync().catch(() => {});
+setInterval(() => serverClock.sync().catch(() => {}), 60000);
+
+// The meeting's spoken countdown: 10 down to 0, one step every 5 seconds; null outside meetings
+function meetingCountdown(data){
+    if(!data.meeting_active || data.meeting_starts_at == null) return null;
+    const elapsed = Math.max(0, (serverClock.now() - data.meeting_starts_at) / 1000);
+    return Math.max(10 - Math.floor(elapsed / 5), 0);
+}
+
+// ------------------------------
+// Alerts and effects
+// ------------------------------
+// Every timer an effect starts is tracked, and all of them are cleared when a
+// new round starts or the game is reset, so nothing fires into the next game.
+const effectTimers = new Set();
+
+function later(ms, fn){
+    const id = setTimeout(() => { effectTimers.delete(id); fn(); }, ms);
+    effectTimers.add(id);
+    return id;
+}
+
+function cancel(id){
+    clearTimeout(id);
+    clearInterval(id);
+    effectTimers.delete(id);
+}
+
+function clearEffects(){
+    for(const id of effectTimers) cancel(id);
+    for(const id in alertTimers) document.getElementById(id).style.display = 'none';
+    stopBlink();
+    if('speechSynthesis' in window) window.speechSynthesis.cancel();
+}
+
+// Shows msg in the element (#alert by default) for 10 seconds; a newer message restarts the timer
+const alertTimers = {};
+function showAlert(msg, id = 'alert'){
+    const el = document.getElementById(id);
+    el.innerText = msg;
+    el.style.display = 'block';
+    cancel(alertTimers[id]);
+    alertTimers[id] = later(10000, () => { el.style.display = 'none'; });
+}
+
+function speak(msg){
+    if('speechSynthesis' in window){
+        const utter = new SpeechSynthesisUtterance(msg);
+        utter.rate = 1;
+        window.speechSynthesis.speak(utter);
+    }
+}
+
+// Flashes the background; a new blink replaces the one running
+let blinkTimer = null;
+function blinkBackground(color, duration = 13000){
+    stopBlink();
+    let blink = true;
+    const timer = blinkTimer = setInterval(() => {
+        document.body.style.backgroundColor = blink ? color : '';
+        blink = !blink;
+    }, 500);
+    effectTimers.add(timer);
+    later(duration, () => { if(blinkTimer === timer) stopBlink(); });
+}
+
+function stopBlink(){
+    cancel(blinkTimer);
+    blinkTimer = null;
+    document.body.style.backgroundColor = '';  // back to the page's CSS
+}
+
+// ------------------------------
+// Keyed rendering
+// ------------------------------
+// Every player keeps one element between updates, and an element is only
+// written when what it shows changed. Rebuilding a list with innerHTML on each
+// status push restyled and re-laid out every row (and reset focus on the
+// buttons) when one vote or death came in.
+
+// Writes text only when it differs; identical writes still dirty layout
+function setText(id, text){
+    const el = typeof id === 'string' ? document.getElementById(id) : id;
+    text = String(text);
+    if(el.textContent !== text) el.textContent = text;
+}
+
+// One element per listed player, kept in the order of data.players.
+//   show(p)              whether the player is listed
+//   key(rfid, p)         everything the element shows, as a string; an unchanged key leaves it alone
+//   create(rfid)         a new, empty element
+//   update(el, rfid, p)  fills the element in
+//   empty                placeholder text while nobody is listed
+class PlayerList {
+    constructor(container, {show = () => true, key, create, update, empty = ''}){
+        this.container = typeof container === 'string' ? document.getElementById(container) : container;
+        Object.assign(this, {show, key, create, update});
+        this.nodes = new Map();  // rfid -> {el, key}
+        this.placeholder = document.createElement('p');
+        this.placeholder.textContent = empty;
+        this.container.replaceChildren(this.placeholder);
+    }
+
+    render(players){
+        const listed = Object.entries(players).filter(([rfid, p]) => this.show(p));
+        const keep = new Set(listed.map(([rfid]) => rfid));
+        for(const [rfid, node] of this.nodes){
+            if(!keep.has(rfid)){
+                node.el.remove();
+                this.nodes.delete(rfid);
+            }
+        }
+        const placed = this.placeholder.parentNode === this.container;
+        if(listed.length === 0 && !placed) this.container.appendChild(this.placeholder);
+        else if(listed.length > 0 && placed) this.placeholder.remove();
+
+        let prev = null;
+        for(const [rfid, p] of listed){
+            let node = this.nodes.get(rfid);
+            if(!node){
+                node = {el: this.create(rfid), key: null};
+                node.el.dataset.rfid = rfid;
+                this.nodes.set(rfid, node);
+            }
+            const key = this.key(rfid, p);
+            if(key !== node.key){
+                this.update(node.el, rfid, p);
+                node.key = key;
+            }
+            // Only new elements are out of place; the others stay where they are
+            const next = prev ? prev.nextSibling : this.container.firstChild;
+            if(next !== node.el) this.container.insertBefore(node.el, next);
+            prev = node.el;
+        }
+    }
+
+    // Clicks anywhere in a player's element, delegated so elements never need rebinding
+    onClick(handler){
+        this.container.addEventListener('click', (e) => {
+            const el = e.target.closest('[data-rfid]');
+            if(el && this.container.contains(el)) handler(el.dataset.rfid, e);
+        });
+    }
+}
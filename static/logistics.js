@@ -0,0 +1,35 @@
+// Show ONLY dead players
+const deadList = new PlayerList('players-list', {
+    show: p => !p.alive,
+    key: (rfid, p) => `${p.color}|${p.death_type}`,
+    create: () => {
+        const el = document.createElement('p');
+        el.className = 'dead';
+        return el;
+    },
+    update: (el, rfid, p) => { el.textContent = `${p.color} (${rfid}) - ${p.death_type.toUpperCase()}`; },
+    empty: "No deaths yet"
+});
+
+game.on('status', (data) => {
+    setText('tasks-status', data.tasks_done + " / " + data.task_goal);
+    deadList.render(data.players);
+});
+
+// Death alerts
+game.on('playerDied', (rfid, p) => {
+    if(p.death_type === "killed"){
+        showAlert(`${p.color} (${rfid}) WAS KILLED!`);
+        blinkBackground(p.color);
+    } else if(p.death_type === "ejected"){
+        showAlert(`${p.color} (${rfid}) WAS EJECTED!`);
+    }
+});
+
+document.getElementById('complete-task-btn')?.addEventListener('click', async ()=>{
+    await fetch(BASE + '/logistics/complete_task', {method:'POST'});
+    await game.refresh();
+    showAlert("Task complete!");
+});
+
+game.connect();
@@ -0,0 +1,96 @@
+let lastTick=null;
+//let audio = new Audio("/static/incorrect-buzzer-sound-147336.mp3");
+//audio.load();
+/*document.addEventListener("click", () => {
+    audio.play().then(() => {
+        audio.pause();
+        audio.currentTime = 0;
+    }).catch(err => console.log("Autoplay unlock failed", err));
+}, {once: true});
+*/
+
+game.on('status', (data) => {
+    // Update main stats
+    setText('tasks', data.tasks_done + " / " + data.task_goal);
+    let aliveCount = Object.values(data.players).filter(p=>p.alive).length;
+    setText('alive-players', aliveCount + " / " + Object.keys(data.players).length);
+    setText('winner-display', data.game_state === "ended" && data.winner ? data.winner.toUpperCase() + " WINS!" : "");
+/*if (data.pre_meeting_alert && !meetingActive) {
+    // wait 5s AFTER kill before beep sequence starts
+    setTimeout(() => {
+        let beepCount = 0;
+
+        function playBeep(){
+            //audio.currentTime = 0;
+            //audio.play().then(() => {
+                beepCount++;
+                if (beepCount < 3) {
+                   // audio.onended = playBeep;  // chain next beep
+                }
+            }).catch(err => console.log("Play blocked:", err));
+        }
+
+        //playBeep();
+    }, 5000);
+}
+*/
+    renderClock();
+});
+
+// Kills/ejections are announced with a 5s delay; a new game cancels pending ones
+game.on('playerDied', (rfid, p) => {
+    const action = p.death_type;
+    later(5000, ()=>{
+        speak(`${p.color} has been ${action}.`);
+        showAlert(`${p.color} (${action.toUpperCase()})!`);
+        //if(action === "killed") blinkBackground(p.color, 30000);
+    });
+});
+
+game.on('meetingStarted', () => {
+    speak("Meeting started!");
+    showAlert("Meeting started!");
+});
+
+game.on('meetingEnded', (data) => {
+    if(lastTick !== 0 && data.game_state === "running") speak("Meeting over");  // unless the countdown just said it
+    lastTick = null;
+});
+
+// Winner announcement
+game.on('gameEnded', (winner) => {
+    if(!winner) return;
+    if(winner === "crewmates") speak("Game over, The Crewmates have won the game!");
+    else if(winner === "draw") speak("Draw!");
+    else speak(winner.toUpperCase() + " wins!");
+});
+
+// Countdowns run locally against the server's absolute times; no polling for time
+function renderClock(){
+    const data = game.status;
+    if(!data) return;
+    const running = data.game_state === "running";
+    setText('time', (running ? serverClock.secondsUntil(data.game_ends_at) : 0) + "s");
+
+    // Meeting countdown 10→1, one step every 5s
+    if (data.meeting_active && running) {
+        document.getElementById('meeting').style.display = 'block';
+        setText('meeting-count', serverClock.secondsUntil(data.meeting_ends_at) + "s left");
+
+        // TTS countdown, in step with every other screen
+        const countdown = meetingCountdown(data);
+        if (countdown !== null && countdown !== lastTick) {
+            lastTick = countdown;
+            if (lastTick > 0) {
+                speak(lastTick.toString());
+            } else {
+                speak("Meeting over");
+            }
+        }
+    } else {
+        document.getElementById('meeting').style.display = 'none';
+    }
+}
+setInterval(renderClock, 200);
+
+game.connect();
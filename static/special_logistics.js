@@ -0,0 +1,73 @@
+let pendingEject = null;  // the server's eject_selected, shared by every open panel
+let votes = {};           // the meeting's tally, rfid/"skip" -> votes
+
+// Player lists; only the buttons whose selection or vote count changed are touched
+const aliveList = new PlayerList('alive-list', {
+    show: p => p.alive,
+    key: (rfid, p) => `${p.color}|${pendingEject === rfid}|${votes[rfid] || 0}`,
+    create: () => {
+        const el = document.createElement('button');
+        el.className = 'player-btn';
+        return el;
+    },
+    update: (el, rfid, p) => {
+        el.classList.toggle('selected', pendingEject === rfid);
+        el.textContent = p.color + (votes[rfid] ? ` (${votes[rfid]})` : '');
+    },
+    empty: "No alive players"
+});
+aliveList.onClick(rfid => selectEject(rfid));
+
+const deadList = new PlayerList('dead-list', {
+    show: p => !p.alive,
+    key: (rfid, p) => `${p.color}|${p.death_type}`,
+    create: () => {
+        const el = document.createElement('div');
+        el.className = 'player-dead';
+        return el;
+    },
+    update: (el, rfid, p) => { el.textContent = `${p.color} - ${p.death_type.toUpperCase()}`; },
+    empty: "No deaths yet"
+});
+
+game.on('status', (data) => {
+    setText('tasks-status', data.tasks_done + " / " + data.task_goal);
+    pendingEject = data.eject_selected;
+
+    // Votes so far; the server ejects the result itself when the meeting ends
+    votes = data.votes || {};
+    setText('vote-status', data.meeting_active
+        ? `${data.votes_cast} vote(s), ${votes.skip || 0} to skip` : "No meeting");
+
+    // Alive players as eject buttons, dead players with cause
+    aliveList.render(data.players);
+    deadList.render(data.players);
+});
+
+// Handle deaths
+game.on('playerDied', (rfid, p) => {
+    if(p.death_type === "killed"){
+        showAlert(`${p.color} WAS KILLED!`);
+        blinkBackground(p.color); // blink only for kills
+    } else if(p.death_type === "ejected"){
+        showAlert(`${p.color} WAS EJECTED!`);
+    }
+});
+
+// Select/unselect eject; overrides the vote
+async function selectEject(rfid){
+    await fetch(BASE + '/special-logistics/set_eject', {
+        method:'POST',
+        body: new URLSearchParams({'rfid': pendingEject === rfid ? '' : rfid})  // '' clears the selection
+    });
+    game.refresh();
+}
+
+// Complete task button
+document.getElementById('complete-task-btn').addEventListener('click', async ()=>{
+    await fetch(BASE + '/logistics/complete_task', {method:'POST'});
+    await game.refresh();
+    showAlert("Task complete!");
+});
+
+game.connect();
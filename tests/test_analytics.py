@@ -0,0 +1,40 @@
+import pytest
+
+from analytics import ROUND_COLUMNS, AnalyticsStore
+from game import GameState
+
+
+def round_row(**values):
+    row = {name: 0 for name, _ in ROUND_COLUMNS}
+    row.update(values)
+    return row
+
+
+def test_empty_store(tmp_path):
+    store = AnalyticsStore(str(tmp_path))
+    assert store.aggregate() == {"rounds": 0}
+    assert store.aggregate("task_goal") == {"group_by": "task_goal", "groups": {}}
+    assert store.timeline(0) is None
+    # A second process opening the same empty store sees the same
+    assert AnalyticsStore(str(tmp_path)).aggregate() == {"rounds": 0}
+
+
+def test_bad_round_writes_nothing(tmp_path):
+    store = AnalyticsStore(str(tmp_path))
+    store.add_round(round_row(winner=1), [{"type": 1, "t": 1.0}])
+    store.add_round(round_row(meeting_duration=0.5), [{"type": 1, "t": 2.0}])
+    with pytest.raises(TypeError):
+        store.flush()
+    # No events without their round, whose id the next round would get
+    assert store.events.refresh() == 0
+    assert store.aggregate() == {"rounds": 0}
+    assert len(store.pending) == 2
+
+
+def test_configure_rejects_fractional_durations():
+    game = GameState()
+    with pytest.raises(ValueError):
+        game.configure(meeting_duration=0.5)
+    game.configure(meeting_duration=30.0, game_duration=600)
+    assert (game.meeting_duration, game.game_duration) == (30, 600)
+    assert isinstance(game.meeting_duration, int)
@@ -0,0 +1,7 @@
+from bench import bench_contention
+
+
+def test_contention():
+    # Small enough for every run, large enough that the races overlap
+    result = bench_contention(games=5, threads=16, ops=600, players=20)
+    assert result["errors"] == []
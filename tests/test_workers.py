@@ -0,0 +1,73 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS = 2
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(server, url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        assert server.poll() is None, f"server exited with {server.returncode}"
+        try:
+            if httpx.get(url + "/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise AssertionError("server not ready")
+
+
+def test_workers_agree(tmp_path):
+    """uvicorn --workers on the sqlite backend: transitions made through any worker
+    leave every worker reporting the same /status."""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, GAME_BACKEND="sqlite", GAME_DATA_DIR=str(tmp_path))
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                               "--workers", str(WORKERS), "--log-level", "warning"], env=env, cwd=ROOT)
+    try:
+        wait_ready(server, url)
+
+        # A new connection per request, so the kernel spreads them over the workers
+        def post(path):
+            assert httpx.post(url + path).status_code == 200
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda i: httpx.get(f"{url}/connect/W{i}/C{i}"), range(10)))
+        post("/reset")
+        post("/start")
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(post, ["/logistics/complete_task"] * 3 + ["/eject/W0"]))
+
+        def look(_):
+            # /ready and /status on one keep-alive connection come from the same worker
+            with httpx.Client(base_url=url) as client:
+                return client.get("/ready").json()["worker"], client.get("/status").json()
+
+        views = {}  # worker pid -> its /status
+        deadline = time.monotonic() + 30
+        while len(views) < WORKERS and time.monotonic() < deadline:
+            with ThreadPoolExecutor(8) as pool:
+                views.update(pool.map(look, range(8)))
+        assert len(views) == WORKERS
+        statuses = list(views.values())
+        assert statuses[0]["game_state"] == "running"
+        assert statuses[0]["tasks_done"] == 3 and len(statuses[0]["players"]) == 10
+        assert all(status == statuses[0] for status in statuses), {
+            worker: (status["version"], status["game_state"]) for worker, status in views.items()}
+    finally:
+        server.terminate()
+        server.wait()